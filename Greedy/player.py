@@ -1,11 +1,19 @@
 from _404NotFound_.algorithm.minimax import *
+from _404NotFound_.env.batch import np, board_array, component_totals
 from _404NotFound_.env.board import *
+from _404NotFound_.env.bitboard import BitBoard
 from _404NotFound_.env.pos import *
 
 from functools import reduce
 
 
 class Player:
+    # use the mask based BitBoard engine instead of the list based Board
+    bitboard = False
+    # evaluate the successors in one NumPy batch when NumPy is installed;
+    # off, the boards' incremental counts make the one by one evaluation
+    # cheaper than building the batch
+    batch = False
 
     def __init__(self, colour):
         """
@@ -18,7 +26,7 @@ class Player:
         strings "white" or "black" correspondingly.
         """
         self.color = Color.white if colour == "white" else Color.black
-        self.board = Board(True)
+        self.board = BitBoard(True) if self.bitboard else Board(True)
 
     def action(self):
         """
@@ -32,10 +40,8 @@ class Player:
         board = self.board
 
         def eval(board):
-            self_pieces = board.get_pieces(color)
-            other_pieces = board.get_pieces(opposite(color))
-            self_pieces_num = sum(stack[1] for stack in self_pieces)
-            other_pieces_num = sum(stack[1] for stack in other_pieces)
+            self_pieces_num = board.count_tokens(color)
+            other_pieces_num = board.count_tokens(opposite(color))
 
             boom_component = board.get_boom_component()
             boom_reward = []
@@ -55,7 +61,32 @@ class Player:
                 f0 = (self_pieces_num - sum(boom_penalty)) / (other_pieces_num - sum(boom_reward))
             return (ft, f0)
 
-        all_state = [(eval(s[0]), s) for s in board.all_possible_states(color)]
+        # the same evaluation for all the successors in one batch
+        def eval_batch(boards):
+            cells = board_array(boards).astype(np.int64)
+            own = cells * color.value
+            self_pieces_num = np.maximum(own, 0).sum(1)
+            other_pieces_num = np.maximum(-own, 0).sum(1)
+
+            white, black = component_totals(cells)
+            self_total, other_total = (white, black) if color == Color.white else (black, white)
+            mixed = (self_total > 0) & (other_total > 0)
+            ratio = self_pieces_num / np.where(other_pieces_num == 0, 1, other_pieces_num)
+            delta = ratio[:, None] * other_total - self_total
+            boom_reward = np.where(mixed & (delta > 0), delta, 0).sum(1)
+            boom_penalty = np.where(mixed & (delta <= 0), -delta, 0).sum(1)
+
+            def ratio_of(a, b):
+                return np.where(b == 0, a / 0.01, a / np.where(b == 0, 1, b))
+            ft = ratio_of(self_pieces_num, other_pieces_num)
+            f0 = ratio_of(self_pieces_num - boom_penalty, other_pieces_num - boom_reward)
+            return list(zip(ft.tolist(), f0.tolist()))
+
+        states = list(board.all_possible_states(color))
+        if self.batch and np is not None:
+            all_state = list(zip(eval_batch([s[0] for s in states]), states))
+        else:
+            all_state = [(eval(s[0]), s) for s in states]
         all_state.sort(key=lambda pair: pair[0], reverse=True)
         largets_eval = all_state[0][0]
         best_states = [pair[1] for pair in all_state if pair[0] == largets_eval]
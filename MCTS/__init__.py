@@ -0,0 +1 @@
+from MCTS.player import Player
\ No newline at end of file
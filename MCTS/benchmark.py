@@ -0,0 +1,43 @@
+"""
+MCTS against the negamax search of _404NotFound_ at equal CPU time.
+Run with: python -m MCTS.benchmark [seconds]
+"""
+
+import sys
+import time
+
+from _404NotFound_.algorithm.negamax import Negamax
+from _404NotFound_.algorithm.transposition import TranspositionTable
+from _404NotFound_.benchmark import midgame_positions
+from _404NotFound_.env.board import *
+from _404NotFound_.player import Scalar_Node
+from MCTS.player import Player, TreeNode
+
+
+# playouts/second and the action of MCTS, and the depth, nodes/second and
+# action of iterative deepening, given seconds each on the midgame positions
+def bench_mcts(seconds=2):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, {}s, {} to move".format(i, seconds, color.name))
+        player = Player(color.name)
+        player.board = board
+        player.root = TreeNode(None, opposite(color))
+        start = time.process_time()
+        count = 0
+        while time.process_time() - start < seconds:
+            player.playout(board.copy())
+            count += 1
+        elapsed = time.process_time() - start
+        action = max(player.root.children.values(), key=lambda child: child.visits).action
+        print("{:<12}{:>10} playouts{:>10.0f}/s  {}".format("mcts", count, count / elapsed, action))
+
+        engine = Negamax(tt=TranspositionTable(), inplace=True, pvs=True)
+        start = time.process_time()
+        action = engine.iterative_deepening(Scalar_Node(board.copy(), color), 20, seconds, seconds)
+        elapsed = time.process_time() - start
+        print("{:<12}{:>10} nodes   {:>10.0f}/s  depth {}  {}".format(
+            "negamax", engine.nodes, engine.nodes / elapsed, engine.completed, action))
+
+
+if __name__ == "__main__":
+    bench_mcts(*(int(arg) for arg in sys.argv[1:]))
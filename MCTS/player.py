@@ -0,0 +1,204 @@
+"""
+Monte Carlo tree search player.
+Every playout selects down the tree with UCT, expands one new node, plays a
+fast random rollout from it and backs the result up the path. The subtree
+under the actions actually played is kept from one turn to the next.
+"""
+import math
+import random
+import sys
+import time
+
+from _404NotFound_.algorithm.timer import TimeManager
+from _404NotFound_.env.board import *
+
+
+class TreeNode:
+    # action: the action leading to the node, played by color
+    # wins: sum of the results for color, 1 for a win and 0.5 for a draw
+    # untried: actions not expanded yet, None until the node is first visited
+    __slots__ = ("action", "color", "children", "untried", "visits", "wins")
+
+    def __init__(self, action, color):
+        self.action = action
+        self.color = color
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.wins = 0
+
+    def uct_child(self, exploration):
+        log = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log / child.visits))
+
+
+class Player:
+    # playouts per turn, 0 to play for the CPU time the clock allocates
+    playouts = 0
+    # CPU seconds for the whole game, the referee's -t default
+    time_budget = 60
+    # UCT exploration constant
+    exploration = 1.4
+    # plies of a rollout before the material decides it
+    rollout_depth = 30
+    # rollouts take the boom winning the most material when there is one
+    greedy_rollouts = True
+    # print the playouts and playouts/second of every turn to stderr
+    verbose = False
+    seed = None
+
+    def __init__(self, colour):
+        """
+        This method is called once at the beginning of the game to initialise
+        your player. You should use this opportunity to set up your own internal
+        representation of the game state, and any other information about the
+        game state you would like to maintain for the duration of the game.
+        The parameter colour will be a string representing the player your
+        program will play as (White or Black). The value will be one of the
+        strings "white" or "black" correspondingly.
+        """
+        self.clock = TimeManager(self.time_budget)
+        self.clock.start()
+        self.color = Color.white if colour == "white" else Color.black
+        self.board = Board(True)
+        self.random = random.Random(self.seed)
+        # the tree of the position on the board, the player to move next
+        # is opposite(self.root.color)
+        self.root = TreeNode(None, Color.black)
+        # playouts and their rate in the last turn
+        self.last_playouts = 0
+        self.playouts_per_second = 0
+        self.clock.stop()
+
+    def action(self):
+        """
+        This method is called at the beginning of each of your turns to request
+        a choice of action from your program.
+        Based on the current state of the game, your player should select and
+        return an allowed action to play on this turn. The action must be
+        represented based on the spec's instructions for representing actions.
+        """
+        self.clock.start()
+        board = self.board.copy()
+        soft = self.clock.allocate()[0]
+        start = time.process_time()
+        count = 0
+        while count < self.playouts if self.playouts else \
+                not count or time.process_time() - start < soft:
+            self.playout(board)
+            count += 1
+        elapsed = time.process_time() - start
+        self.last_playouts = count
+        self.playouts_per_second = count / elapsed if elapsed else 0
+        if self.verbose:
+            print("# mcts: {} playouts, {:.0f} playouts/s".format(count, self.playouts_per_second),
+                  file=sys.stderr)
+        # the most visited action, the most robust estimate
+        action = max(self.root.children.values(), key=lambda child: child.visits).action
+        self.clock.turns += 1
+        self.clock.stop()
+        return action
+
+    def update(self, colour, action):
+        """
+        This method is called at the end of every turn (including your player’s
+        turns) to inform your player about the most recent action. You should
+        use this opportunity to maintain your internal representation of the
+        game state and any other information about the game you are storing.
+        The parameter colour will be a string representing the player whose turn
+        it is (White or Black). The value will be one of the strings "white" or
+        "black" correspondingly.
+        The parameter action is a representation of the most recent action
+        conforming to the spec's instructions for representing actions.
+        You may assume that action will always correspond to an allowed action
+        for the player colour (your method does not need to validate the action
+        against the game rules).
+        """
+        self.clock.start()
+        color = Color.white if colour == "white" else Color.black
+        previous = self.board
+        self.board = previous.apply_action(action)
+        # keep the subtree of the action played; the tree has one boom per
+        # component, any boom of the component gives the same board
+        child = self.root.children.get(action)
+        if child is None and action[0] == "BOOM":
+            for alias in previous.boom_aliases(action, color):
+                child = self.root.children.get(alias)
+                if child is not None:
+                    break
+        self.root = child if child is not None else TreeNode(action, color)
+        self.clock.stop()
+
+    # one playout from the root on board, which is left unchanged
+    def playout(self, board):
+        node = self.root
+        path = [node]
+        tokens = []
+        # selection
+        while node.untried == [] and node.children:
+            node = node.uct_child(self.exploration)
+            path.append(node)
+            tokens.append(board.make(node.action))
+        # expansion
+        color = opposite(node.color)
+        if not self.game_over(board):
+            if node.untried is None:
+                node.untried = list(board.all_possible_actions(color))[::-1]
+            if node.untried:
+                action = node.untried.pop()
+                child = TreeNode(action, color)
+                node.children[action] = child
+                node = child
+                path.append(node)
+                tokens.append(board.make(action))
+                color = opposite(color)
+        # rollout
+        for depth in range(self.rollout_depth):
+            if self.game_over(board):
+                break
+            tokens.append(board.make(self.rollout_action(board, color)))
+            color = opposite(color)
+        result = self.result(board)
+        while tokens:
+            board.unmake(tokens.pop())
+        # backup
+        for node in path:
+            node.visits += 1
+            node.wins += result if node.color == Color.white else 1 - result
+
+    def game_over(self, board):
+        return not board.count_tokens(Color.white) or not board.count_tokens(Color.black)
+
+    # 1 for a white win, 0 for a black win, 0.5 for a draw: the side with
+    # more tokens wins when the rollout stops
+    def result(self, board):
+        white = board.count_tokens(Color.white)
+        black = board.count_tokens(Color.black)
+        return 1 if white > black else 0 if white < black else 0.5
+
+    # a random stack of color moves or booms at random, after the boom
+    # winning the most material with greedy_rollouts
+    def rollout_action(self, board, color):
+        if self.greedy_rollouts:
+            best, gain = None, 0
+            for action in board.boom_actions(color):
+                white, black = board.component_totals(action[1][1] * BOARD_LEN + action[1][0])
+                won = black - white if color == Color.white else white - black
+                if won > gain:
+                    best, gain = action, won
+            if best is not None:
+                return best
+        cells = board.cells
+        sign = color.value
+        squares = board.get_stacks(color)[0]
+        i = squares[self.random.randrange(len(squares))]
+        num = cells[i] * sign
+        targets = [j for j in CARD_NEIGHBOURS[i][num] if cells[j] * sign >= 0]
+        # a stack can boom any time, a boom only next to an enemy changes
+        # the enemy side
+        can_boom = board.adjacent[(1 - SIDE[color]) * BOARD_LEN ** 2 + i]
+        k = self.random.randrange(len(targets) * num + (1 if can_boom else 0) or 1)
+        if k < len(targets) * num:
+            return ("MOVE", k % num + 1, COORDS[i], COORDS[targets[k // num]])
+        return ("BOOM", COORDS[i])
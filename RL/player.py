@@ -1,7 +1,10 @@
 from _404NotFound_ import player
+from _404NotFound_.env.board import rekey_state_values
 import pickle
 
 class Player(player.Player):
+    # the opening book was built without the state values
+    book_path = None
 
     def __init__(self, color):
         """
@@ -18,7 +21,7 @@ class Player(player.Player):
         # my_file = os.path.join(os.path.join("RL"), '_500_lr=02.pickle')
         super().__init__(color)
         with open("RL/train/new_1200_lr=05.pickle", "rb") as f:
-            self.state_values = pickle.load(f)[0] if color == "white" else pickle.load(f)[1]
+            self.state_values = rekey_state_values(pickle.load(f)[0 if color == "white" else 1])
 
         # with open("RL/train/_1_lr=02.pickle", "rb") as f:
         #     self.agents = pickle.load(f)[0] if color == "white" else pickle.load(f)[1]
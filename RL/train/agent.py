@@ -1,10 +1,17 @@
 from _404NotFound_ import player
-from _404NotFound_.env.board import Color
+from _404NotFound_.env.board import Color, rekey_state_values
 from manual import player as human
 import pickle
 from timeit import default_timer as time
 
 class Agent(player.Player):
+    # one Agent plays every training game, so no time limit, which would
+    # run out across games, but the fixed depth training always searched
+    # to, and no book, built without the state values
+    time_budget = float("inf")
+    search_depth = 3
+    book_path = None
+
     def __init__(self, color):
         super().__init__(color)
         self.lr = 0.5
@@ -71,7 +78,7 @@ def play_game(p1, p2, referee, plot=False):
         p1.update(current_player.color, action)
         p2.update(current_player.color, action)
 
-        state = tuple(current_player.board.cells)
+        state = current_player.board.canonical_key
 
         p1.add_history(state)
         p2.add_history(state)
@@ -97,8 +104,8 @@ def self_train(instance=5000, filename_in="", filename_out="", save_model=1):
     if filename_in:
         with open(filename_in, "rb") as f:
             state_values_1, state_values_2 = pickle.load(f)
-            p1.set_state_values(state_values_1)
-            p2.set_state_values(state_values_2)
+            p1.set_state_values(rekey_state_values(state_values_1))
+            p2.set_state_values(rekey_state_values(state_values_2))
 
     for t in range(instance):
         if t % 10 == 0:
@@ -0,0 +1,58 @@
+"""
+An opening book in a sorted binary file.
+Every record is one book move of a position: <key> <action> <visits>
+<score>, 24 bytes little endian, sorted by key so the file is memory mapped
+and binary searched without being loaded.
+"""
+import mmap
+import os
+import struct
+
+from _404NotFound_.algorithm.transposition import encode_action, decode_action
+
+# key, encoded action, games the move was played in, score for the mover
+RECORD = struct.Struct("<QIId")
+KEY = struct.Struct("<Q")
+
+
+# write {(<key>, <action>): (<visits>, <score>)} to path
+def write_book(path, moves):
+    with open(path, "wb") as file:
+        for (key, action), (visits, score) in sorted(moves.items(), key=lambda move: move[0][0]):
+            file.write(RECORD.pack(key, encode_action(action), visits, score))
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.size = os.path.getsize(path) // RECORD.size
+        self.data = None
+        if self.size:
+            with open(path, "rb") as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.size
+
+    # return [(<action>, <visits>, <score>)] of the position key, most
+    # visited first, [] when it is not in the book
+    def probe(self, key):
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(self.data, mid * RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        while lo < self.size:
+            record_key, code, visits, score = RECORD.unpack_from(self.data, lo * RECORD.size)
+            if record_key != key:
+                break
+            moves.append((decode_action(code), visits, score))
+            lo += 1
+        moves.sort(key=lambda move: (-move[1], -move[2]))
+        return moves
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
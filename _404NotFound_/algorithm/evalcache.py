@@ -0,0 +1,56 @@
+"""
+A bounded cache of static evaluations keyed by position hash.
+Leaves reached by different move orders, and the positions searched again
+by the next iteration or the next turn, are evaluated once. The least
+recently used entry is evicted when the cache is full.
+"""
+from collections import OrderedDict
+
+# rough size of one entry in CPython (int key, packed score, links)
+CACHE_ENTRY_BYTES = 160
+
+# xor-ed into the key of positions evaluated for the black player
+BLACK_KEY = 0x632BE59BD9B4E019
+
+
+class EvaluationCache:
+    def __init__(self, size_mb=8):
+        self.size_mb = size_mb
+        self.size = max(1, size_mb * 2 ** 20 // CACHE_ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # pickled (to a worker process) as an empty cache of the same size
+    def __reduce__(self):
+        return EvaluationCache, (self.size_mb,)
+
+    # the cached evaluation, None on a miss
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def hit_rate(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate(), "evictions": self.evictions}
@@ -1,5 +1,7 @@
 from enum import Enum
 
+from _404NotFound_.algorithm.transposition import *
+
 
 class MMStage(Enum):
     min_stage = 0
@@ -23,26 +25,74 @@ class Node:
     def evaluation(self):
         pass
 
+    # in place search: the node keeps one state and walks the tree with
+    # make / unmake instead of creating a successor node per action
+
+    # return a iterable of actions
+    def actions(self, minimax_stage):
+        pass
+
+    # apply the action to self.state, return an undo token
+    def make(self, action):
+        return self.state.make(action)
+
+    # restore self.state with the token returned by make
+    def unmake(self, token):
+        self.state.unmake(token)
+
+    # return the material won by the player of minimax_stage with action,
+    # None when the action captures nothing
+    def capture(self, action, minimax_stage):
+        return None
+
+    # return a iterable of the capturing actions, the only ones searched by
+    # quiescence
+    def captures(self, minimax_stage):
+        return [action for action in self.actions(minimax_stage)
+                if self.capture(action, minimax_stage) is not None]
+
+    # return (<lowest>, <highest>) evaluation reachable after the capturing
+    # action, None when unknown
+    def capture_bounds(self, action):
+        return None
+
+    # return the evaluations of the children reached by actions, computed
+    # together, None when the node can only evaluate one by one
+    def child_evaluations(self, actions):
+        return None
+
+    # return the exact evaluation of the position with the player of
+    # minimax_stage to move from an endgame tablebase, None when it is not
+    # in one
+    def endgame_score(self, minimax_stage):
+        return None
+
+    # return the evaluation of a position the RL state values give win
+    # probability v
+    def value_score(self, v):
+        return (13, v) if v > 0.8 else (-1, v)
+
     def __lt__(self, other):
         return self.evaluation() < other.evaluation()
 
 
-def minimax_decision(init_node, depth, state_values):
+# tt: optional TranspositionTable, nodes need a hashable state.key
+def minimax_decision(init_node, depth, state_values, tt=None):
     res = None
     a = None
     for node in init_node.successors(MMStage.max_stage):
-        node_value = minimax_min(node, a, None, depth-1, state_values)
+        node_value = minimax_min(node, a, None, depth-1, state_values, tt)
         if not a or node_value > a:
             a = node_value
             res = node.action
     return res
 
 
-def minimax_max(node, a, b, depth, state_values):
+def minimax_max(node, a, b, depth, state_values, tt=None):
 
-    # For ML
-    if tuple(node.state.cells) in state_values:
-        v = state_values[tuple(node.state.cells)]
+    # For ML, state_values is keyed by board.canonical_key
+    if node.state.canonical_key in state_values:
+        v = state_values[node.state.canonical_key]
         if v > 0.8:
             return 13, v
         elif v < 0.2:
@@ -50,20 +100,31 @@ def minimax_max(node, a, b, depth, state_values):
 
     if depth == 0 or node.cutoff():
         return node.evaluation()
+    if tt is not None:
+        key = node.state.key
+        value = tt_cutoff(tt, tt.probe(key), depth, a, b)
+        if value is not None:
+            return value
+    a0, best = a, None
     for successor in node.successors(MMStage.max_stage):
         #print(successor.action)
-        min_value = minimax_min(successor, a, b, depth-1, state_values)
-        a = max(a, min_value) if a else min_value
+        min_value = minimax_min(successor, a, b, depth-1, state_values, tt)
+        if not a or min_value > a:
+            a, best = min_value, successor.action
         if b and a >= b:
+            if tt is not None:
+                tt.store(key, depth, Bound.lower, b, best)
             return b
+    if tt is not None and a is not None:
+        tt.store(key, depth, tt_bound(a, a0, b), a, best)
     return a
 
 
-def minimax_min(node, a, b, depth, state_values):
+def minimax_min(node, a, b, depth, state_values, tt=None):
 
-    # For ML
-    if tuple(node.state.cells) in state_values:
-        v = state_values[tuple(node.state.cells)]
+    # For ML, state_values is keyed by board.canonical_key
+    if node.state.canonical_key in state_values:
+        v = state_values[node.state.canonical_key]
         if v > 0.8:
             return 13, v
         elif v < 0.2:
@@ -71,10 +132,108 @@ def minimax_min(node, a, b, depth, state_values):
 
     if depth == 0 or node.cutoff():
         return node.evaluation()
+    if tt is not None:
+        key = node.state.key ^ MIN_STAGE_KEY
+        value = tt_cutoff(tt, tt.probe(key), depth, a, b)
+        if value is not None:
+            return value
+    b0, best = b, None
     for successor in node.successors(MMStage.min_stage):
         #print(successor.action)
-        max_value = minimax_max(successor, a, b, depth-1, state_values)
-        b = min(b, max_value) if b else max_value
+        max_value = minimax_max(successor, a, b, depth-1, state_values, tt)
+        if not b or max_value < b:
+            b, best = max_value, successor.action
+        if a and b <= a:
+            if tt is not None:
+                tt.store(key, depth, Bound.upper, a, best)
+            return a
+    if tt is not None and b is not None:
+        tt.store(key, depth, tt_bound(b, a, b0), b, best)
+    return b
+
+
+def minimax_decision_inplace(init_node, depth, state_values, tt=None):
+    res = None
+    a = None
+    for action in init_node.actions(MMStage.max_stage):
+        token = init_node.make(action)
+        node_value = minimax_min_inplace(init_node, a, None, depth-1, state_values, tt)
+        init_node.unmake(token)
+        if not a or node_value > a:
+            a = node_value
+            res = action
+    return res
+
+
+def minimax_max_inplace(node, a, b, depth, state_values, tt=None):
+
+    # For ML, state_values is keyed by board.canonical_key
+    if node.state.canonical_key in state_values:
+        v = state_values[node.state.canonical_key]
+        if v > 0.8:
+            return 13, v
+        elif v < 0.2:
+            return -1, v
+
+    if depth == 0 or node.cutoff():
+        return node.evaluation()
+    actions = node.actions(MMStage.max_stage)
+    if tt is not None:
+        key = node.state.key
+        entry = tt.probe(key)
+        value = tt_cutoff(tt, entry, depth, a, b)
+        if value is not None:
+            return value
+        # try the best action of an earlier search first
+        actions = tt_order(actions, entry)
+    a0, best = a, None
+    for action in actions:
+        token = node.make(action)
+        min_value = minimax_min_inplace(node, a, b, depth-1, state_values, tt)
+        node.unmake(token)
+        if not a or min_value > a:
+            a, best = min_value, action
+        if b and a >= b:
+            if tt is not None:
+                tt.store(key, depth, Bound.lower, b, best)
+            return b
+    if tt is not None and a is not None:
+        tt.store(key, depth, tt_bound(a, a0, b), a, best)
+    return a
+
+
+def minimax_min_inplace(node, a, b, depth, state_values, tt=None):
+
+    # For ML, state_values is keyed by board.canonical_key
+    if node.state.canonical_key in state_values:
+        v = state_values[node.state.canonical_key]
+        if v > 0.8:
+            return 13, v
+        elif v < 0.2:
+            return -1, v
+
+    if depth == 0 or node.cutoff():
+        return node.evaluation()
+    actions = node.actions(MMStage.min_stage)
+    if tt is not None:
+        key = node.state.key ^ MIN_STAGE_KEY
+        entry = tt.probe(key)
+        value = tt_cutoff(tt, entry, depth, a, b)
+        if value is not None:
+            return value
+        # try the best action of an earlier search first
+        actions = tt_order(actions, entry)
+    b0, best = b, None
+    for action in actions:
+        token = node.make(action)
+        max_value = minimax_max_inplace(node, a, b, depth-1, state_values, tt)
+        node.unmake(token)
+        if not b or max_value < b:
+            b, best = max_value, action
         if a and b <= a:
+            if tt is not None:
+                tt.store(key, depth, Bound.upper, a, best)
             return a
+    if tt is not None and b is not None:
+        tt.store(key, depth, tt_bound(b, a, b0), b, best)
     return b
@@ -0,0 +1,467 @@
+"""
+Negamax alpha-beta search over the minimax Node contract.
+Bounds start at -inf / +inf and are passed down at every level, including
+the root, and the search counts what it does so pruning can be measured.
+Scores are tuples compared lexicographically or scalars; principal
+variation search and aspiration windows need scalar (integer) scores.
+"""
+import time
+
+from _404NotFound_.algorithm.minimax import MMStage
+from _404NotFound_.algorithm.timer import SearchTimeout
+from _404NotFound_.algorithm.transposition import *
+from _404NotFound_.env.board import Board
+
+# bounds below / above every tuple score
+NEG_INF = (float("-inf"),)
+POS_INF = (float("inf"),)
+
+# plies with killer move slots
+MAX_PLY = 64
+
+
+# negate a score, tuples are negated element by element, which reverses
+# their lexicographic order (scores compared must have the same length)
+def negate(value):
+    if isinstance(value, tuple):
+        return tuple(-v for v in value)
+    return -value
+
+
+def other(stage):
+    return MMStage.min_stage if stage == MMStage.max_stage else MMStage.max_stage
+
+
+class Negamax:
+    """
+    state_values: optional {<state key>: <win probability>} of the RL player
+    tt: optional TranspositionTable, nodes need a hashable state.key
+    inplace: walk the tree with Node.actions / make / unmake instead of
+        Node.successors
+    ordering: in place, order actions by tt action, captures by material
+        won, killer moves, then history score
+    quiescence: in place, plies of captures searched past the horizon,
+        0 evaluates the horizon nodes as they stand
+    pvs: with scalar scores, search every action after the first with a
+        null window and again with the full window only when it fails high
+    aspiration: with scalar scores, iterative deepening searches around
+        the previous iteration's score, aspiration above and below it
+    parallel: optional ParallelRoot, with scalar scores its workers search
+        the root actions after the first in iterative deepening
+    root_shift: in place, rotate the root actions after the first by this
+        many places, so lazy SMP helpers start on different actions
+    batch: in place, without quiescence or state values, evaluate the
+        children of depth 1 nodes in one Node.child_evaluations call
+    """
+    def __init__(self, state_values=None, tt=None, inplace=False, ordering=True, quiescence=0,
+                 pvs=False, aspiration=None, parallel=None, root_shift=0, batch=False):
+        self.state_values = state_values if state_values is not None else {}
+        self.tt = tt
+        self.inplace = inplace
+        self.ordering = ordering
+        self.quiescence = quiescence if inplace else 0
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.parallel = parallel
+        self.root_shift = root_shift
+        self.batch = batch and inplace and not quiescence
+        # bounds below / above every score, set by the first search from the
+        # type of the root evaluation
+        self.scalar = None
+        self.neg_inf = self.pos_inf = None
+        # two quiet actions per ply that caused the latest cutoffs there
+        self.killers = [[None, None] for i in range(MAX_PLY)]
+        # {<quiet action>: <score>}, a move action names its from square,
+        # to square and count
+        self.history = {}
+        # time of clock after which a search raises SearchTimeout
+        self.clock = time.process_time
+        self.deadline = None
+        # optional shared flag (a multiprocessing.Value), a search raises
+        # SearchTimeout once it is set
+        self.stop = None
+        # depth of the last iteration completed by iterative_deepening
+        self.completed = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.depth = 0
+        self.nodes = 0
+        # quiescence nodes, and captures skipped as unable to reach alpha
+        self.qnodes = 0
+        self.delta_pruned = 0
+        # nodes and beta cutoffs counted by ply (distance from the root)
+        self.nodes_per_ply = []
+        self.cutoffs_per_ply = []
+        # nodes whose children were searched, and {<depth>: <nodes>} of the
+        # iterations of iterative deepening
+        self.interior = 0
+        self.nodes_per_depth = {}
+        # cutoffs caused by the first child searched
+        self.first_cutoffs = 0
+        # full window searches after a null window failed high, and
+        # aspiration windows the root score fell outside of
+        self.researches = 0
+        self.aspiration_fails = 0
+        # nodes scored exactly by the endgame tablebase
+        self.tablebase_hits = 0
+        # booms move generation left out as duplicates of their component's
+        # (see Board.unique_booms), counted from here
+        self.duplicates_start = Board.duplicates_skipped
+
+    # nodes ** (1 / depth), the branching factor of a uniform tree of the
+    # same size
+    def effective_branching_factor(self):
+        return self.nodes ** (1 / self.depth) if self.depth and self.nodes else 0
+
+    def stats(self):
+        cutoffs = sum(self.cutoffs_per_ply)
+        return {"depth": self.depth, "nodes": self.nodes,
+                "qnodes": self.qnodes, "delta_pruned": self.delta_pruned,
+                "nodes_per_ply": list(self.nodes_per_ply),
+                "cutoffs_per_ply": list(self.cutoffs_per_ply),
+                "interior": self.interior, "nodes_per_depth": dict(self.nodes_per_depth),
+                "first_cutoff_rate": self.first_cutoffs / cutoffs if cutoffs else 0,
+                "researches": self.researches, "aspiration_fails": self.aspiration_fails,
+                "tablebase_hits": self.tablebase_hits,
+                "duplicates_skipped": Board.duplicates_skipped - self.duplicates_start,
+                "ebf": self.effective_branching_factor()}
+
+    # return the best action for the max stage player of init_node
+    def search(self, init_node, depth):
+        self.reset_stats()
+        return self._search_root(init_node, depth)
+
+    # search the root within (alpha, beta), None for unbounded, and keep
+    # its score in self.score
+    def _search_root(self, init_node, depth, alpha=None, beta=None):
+        self._prepare(init_node, depth)
+        self.nodes += 1
+        self.nodes_per_ply[0] += 1
+        alpha = self.neg_inf if alpha is None else alpha
+        beta = self.pos_inf if beta is None else beta
+        alpha0 = alpha
+        self.interior += 1
+        best, res = self.neg_inf, None
+        entry = None
+        if self.tt is not None:
+            # the best action of the previous iteration is searched first
+            entry = self.tt.probe(init_node.state.key)
+        children = self._children(init_node, MMStage.max_stage, 0, entry)
+        for index, (child, action) in enumerate(children):
+            value = self._child_value(child, depth, alpha, beta, MMStage.max_stage, 0, index)
+            if res is None or value > best:
+                best, res = value, action
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                children.close()
+                break
+        self.score = best
+        if self.tt is not None and res is not None:
+            self.tt.store(init_node.state.key, depth, tt_bound(best, alpha0, beta), best, res)
+        return res
+
+    # the value of one root action for the max stage player of init_node,
+    # searched to depth within (alpha, beta), None for unbounded
+    def search_action(self, init_node, action, depth, alpha=None, beta=None):
+        self._prepare(init_node, depth)
+        alpha = self.neg_inf if alpha is None else alpha
+        beta = self.pos_inf if beta is None else beta
+        token = init_node.make(action)
+        value = negate(self._negamax(init_node, depth - 1, negate(beta), negate(alpha), MMStage.min_stage, 1))
+        init_node.unmake(token)
+        return value
+
+    # the root actions in the order the search tries them
+    def root_actions(self, init_node):
+        entry = self.tt.probe(init_node.state.key) if self.tt is not None else None
+        actions = init_node.actions(MMStage.max_stage)
+        if self.ordering:
+            return self._order(init_node, actions, MMStage.max_stage, 0, entry)
+        return list(tt_order(actions, entry))
+
+    # set the score bounds and size the per ply counters for a search
+    def _prepare(self, init_node, depth):
+        if self.scalar is None:
+            self.scalar = not isinstance(init_node.evaluation(), tuple)
+            self.neg_inf, self.pos_inf = (float("-inf"), float("inf")) if self.scalar else (NEG_INF, POS_INF)
+        self.depth = depth
+        while len(self.nodes_per_ply) < depth + self.quiescence + 1:
+            self.nodes_per_ply.append(0)
+            self.cutoffs_per_ply.append(0)
+
+    # the value for the player of stage of the child reached by its index-th
+    # action, searched to depth - 1
+    def _child_value(self, child, depth, alpha, beta, stage, ply, index):
+        if index and self.pvs and self.scalar:
+            # is the child better than alpha at all?
+            value = -self._negamax(child, depth - 1, -alpha - 1, -alpha, other(stage), ply + 1)
+            if not alpha < value < beta:
+                return value
+            self.researches += 1
+        return negate(self._negamax(child, depth - 1, negate(beta), negate(alpha), other(stage), ply + 1))
+
+    # search depth at the previous score +- aspiration, widening a side to
+    # unbounded when the score falls outside it
+    def _aspirate(self, init_node, depth, guess):
+        alpha, beta = guess - self.aspiration, guess + self.aspiration
+        while True:
+            action = self._search_root(init_node, depth, alpha, beta)
+            if self.score <= alpha:
+                alpha = self.neg_inf
+            elif self.score >= beta:
+                beta = self.pos_inf
+            else:
+                return action
+            self.aspiration_fails += 1
+
+    # search first_depth, first_depth + 1, ... up to max_depth, return the
+    # best action of the last completed iteration
+    # soft: seconds after which no new iteration is started
+    # hard: seconds after which a running iteration is abandoned
+    def iterative_deepening(self, init_node, max_depth, soft=None, hard=None, first_depth=1):
+        start = self._cpu_time()
+        # the first depth always completes (unless stopped) so there is an
+        # action to return
+        res = self.search(init_node, first_depth)
+        self.completed = first_depth
+        self.nodes_per_depth[first_depth] = self.nodes
+        guess = self.score
+        if hard is not None:
+            self.deadline = time.process_time() + hard - (self._cpu_time() - start)
+        try:
+            for depth in range(first_depth + 1, max_depth + 1):
+                elapsed = self._cpu_time() - start
+                if soft is not None and elapsed >= soft:
+                    break
+                iteration, nodes = self._cpu_time(), self.nodes
+                try:
+                    if self.parallel is not None and self.scalar:
+                        action = self.parallel.search(self, init_node, depth,
+                                                      None if hard is None else hard - elapsed)
+                    elif self.aspiration is not None and self.scalar:
+                        action = self._aspirate(init_node, depth, guess)
+                    else:
+                        action = self._search_root(init_node, depth)
+                except SearchTimeout:
+                    # the state of init_node is undefined after an abandoned search
+                    break
+                res, self.completed, guess = action, depth, self.score
+                self.nodes_per_depth[depth] = self.nodes - nodes
+                # the next iteration costs about ebf times this one
+                predicted = (self._cpu_time() - iteration) * (self.nodes - nodes) ** (1 / depth)
+                if hard is not None and self._cpu_time() - start + predicted > hard:
+                    break
+        finally:
+            self.deadline = None
+        return res
+
+    # CPU seconds of this process and of the parallel workers
+    def _cpu_time(self):
+        if self.parallel is not None:
+            return time.process_time() + self.parallel.worker_time
+        return time.process_time()
+
+    # the value of node for the player to move in stage
+    def _negamax(self, node, depth, alpha, beta, stage, ply):
+        self.nodes += 1
+        self.nodes_per_ply[ply] += 1
+        if not self.nodes & 255 and (self.deadline is not None and self.clock() > self.deadline
+                                     or self.stop is not None and self.stop.value):
+            raise SearchTimeout()
+
+        # For ML, state_values is keyed by board.canonical_key
+        if node.state.canonical_key in self.state_values:
+            v = self.state_values[node.state.canonical_key]
+            if v > 0.8 or v < 0.2:
+                value = node.value_score(v)
+                return value if stage == MMStage.max_stage else negate(value)
+
+        # an endgame in the tablebase is exact, no search below it
+        value = node.endgame_score(stage)
+        if value is not None:
+            self.tablebase_hits += 1
+            return value if stage == MMStage.max_stage else negate(value)
+
+        if depth == 0 and self.quiescence:
+            return self._quiesce(node, alpha, beta, stage, ply, self.quiescence)
+        if depth == 0 or node.cutoff():
+            value = node.evaluation()
+            return value if stage == MMStage.max_stage else negate(value)
+
+        tt = self.tt
+        entry = None
+        if tt is not None:
+            key = node.state.key if stage == MMStage.max_stage else node.state.key ^ MIN_STAGE_KEY
+            entry = tt.probe(key)
+            value = tt_cutoff(tt, entry, depth, alpha, beta)
+            if value is not None:
+                return value
+
+        alpha0 = alpha
+        self.interior += 1
+        frontier = None
+        if depth == 1 and self.batch and not self.state_values:
+            frontier = self._frontier(node, alpha, beta, stage, ply, entry)
+        if frontier is not None:
+            best, best_action = frontier
+        else:
+            best, best_action = self.neg_inf, None
+            children = self._children(node, stage, ply, entry)
+            for index, (child, action) in enumerate(children):
+                value = self._child_value(child, depth, alpha, beta, stage, ply, index)
+                if best_action is None or value > best:
+                    best, best_action = value, action
+                if best > alpha:
+                    alpha = best
+                if alpha >= beta:
+                    self.cutoffs_per_ply[ply] += 1
+                    if index == 0:
+                        self.first_cutoffs += 1
+                    children.close()
+                    if self.ordering and node.capture(action, stage) is None:
+                        self._reward(action, depth, ply)
+                    break
+
+        if best_action is None:
+            # no legal action, score the position as it stands
+            value = node.evaluation()
+            return value if stage == MMStage.max_stage else negate(value)
+        if tt is not None:
+            tt.store(key, depth, tt_bound(best, alpha0, beta), best, best_action)
+        return best
+
+    # search only captures, the player to move may also stand pat on the
+    # static evaluation; node is counted by the caller
+    def _quiesce(self, node, alpha, beta, stage, ply, depth):
+        self.qnodes += 1
+        value = node.evaluation()
+        best = value if stage == MMStage.max_stage else negate(value)
+        if depth == 0 or best >= beta or node.cutoff():
+            return best
+        if best > alpha:
+            alpha = best
+        for index, action in enumerate(node.captures(stage)):
+            # delta pruning: skip the capture when even the best score it
+            # can lead to cannot reach alpha
+            bounds = node.capture_bounds(action)
+            if bounds is not None:
+                bound = bounds[1] if stage == MMStage.max_stage else negate(bounds[0])
+                if bound <= alpha:
+                    self.delta_pruned += 1
+                    continue
+            token = node.make(action)
+            self.nodes += 1
+            self.nodes_per_ply[ply + 1] += 1
+            value = negate(self._quiesce(node, negate(beta), negate(alpha), other(stage), ply + 1, depth - 1))
+            node.unmake(token)
+            if value > best:
+                best = value
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self.cutoffs_per_ply[ply] += 1
+                if index == 0:
+                    self.first_cutoffs += 1
+                break
+        return best
+
+    # search the children of a depth 1 node evaluated in one batch, return
+    # (<best>, <best action>), None when the node cannot evaluate in batches
+    def _frontier(self, node, alpha, beta, stage, ply, entry):
+        actions = list(self._actions(node, stage, ply, entry))
+        values = node.child_evaluations(actions)
+        if values is None:
+            return None
+        if self.deadline is not None and self.clock() > self.deadline \
+                or self.stop is not None and self.stop.value:
+            raise SearchTimeout()
+        best, best_action = self.neg_inf, None
+        # children up to the cutoff are counted as searched, not every one
+        # evaluated in the batch
+        searched = 0
+        for index, (action, value) in enumerate(zip(actions, values)):
+            searched = index + 1
+            # the children are scored for the max stage player
+            if stage != MMStage.max_stage:
+                value = negate(value)
+            if best_action is None or value > best:
+                best, best_action = value, action
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self.cutoffs_per_ply[ply] += 1
+                if index == 0:
+                    self.first_cutoffs += 1
+                if self.ordering and node.capture(action, stage) is None:
+                    self._reward(action, 1, ply)
+                break
+        self.nodes += searched
+        self.nodes_per_ply[ply + 1] += searched
+        return best, best_action
+
+    # the actions of node in the order they are searched, trying the tt
+    # action first
+    def _actions(self, node, stage, ply, entry):
+        actions = node.actions(stage)
+        if self.ordering:
+            actions = self._order(node, actions, stage, ply, entry)
+        else:
+            actions = tt_order(actions, entry)
+        if not ply and self.root_shift:
+            actions = list(actions)
+            rest = actions[1:]
+            if rest:
+                shift = self.root_shift % len(rest)
+                actions = actions[:1] + rest[shift:] + rest[:shift]
+        return actions
+
+    # yield (<child node>, <action>), trying the tt action first
+    def _children(self, node, stage, ply, entry=None):
+        if self.inplace:
+            actions = self._actions(node, stage, ply, entry)
+            for action in actions:
+                token = node.make(action)
+                try:
+                    yield node, action
+                finally:
+                    node.unmake(token)
+        else:
+            for child in node.successors(stage):
+                yield child, child.action
+
+    # tt action, captures winning or trading material (most first), killers,
+    # then the other actions by history score; losing captures go last
+    def _order(self, node, actions, stage, ply, entry):
+        first = entry[4] if entry is not None else None
+        killers = self.killers[ply]
+        history = self.history
+        ordered, captures, killed, rest, losing = [], [], [], [], []
+        for action in actions:
+            if action == first:
+                ordered.append(action)
+                continue
+            swing = node.capture(action, stage)
+            if swing is not None:
+                (captures if swing >= 0 else losing).append((swing, action))
+            elif action == killers[0] or action == killers[1]:
+                killed.append(action)
+            else:
+                rest.append(action)
+        captures.sort(key=lambda capture: -capture[0])
+        losing.sort(key=lambda capture: -capture[0])
+        rest.sort(key=lambda action: -history.get(action, 0))
+        ordered += [action for swing, action in captures]
+        ordered += killed
+        ordered += rest
+        ordered += [action for swing, action in losing]
+        return ordered
+
+    # remember a quiet action that caused a cutoff
+    def _reward(self, action, depth, ply):
+        killers = self.killers[ply]
+        if action != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = action
+        self.history[action] = self.history.get(action, 0) + depth * depth
@@ -0,0 +1,137 @@
+"""
+Parallel root search over a process pool.
+The parent searches the first root action itself (young brothers wait) and
+hands the other root actions to the workers. The best root score found so
+far is kept in shared memory and every task starts from it as alpha, so
+tasks prune against the actions other workers have finished.
+The referee's process_time covers the parent process only, so the CPU time
+of the workers is returned with every result and summed in worker_time.
+"""
+import copy
+import multiprocessing
+import time
+
+from _404NotFound_.algorithm.negamax import Negamax
+from _404NotFound_.algorithm.timer import SearchTimeout
+from _404NotFound_.algorithm.transposition import *
+
+
+class SharedBound:
+    """ an integer lower bound in shared memory, raised by any process """
+    # bytes of the signed value, packed scores take more than 64 bits
+    SIZE = 32
+
+    def __init__(self):
+        # [<set>, <value bytes>...]
+        self.array = multiprocessing.Array("B", self.SIZE + 1)
+
+    def reset(self):
+        with self.array.get_lock():
+            self.array[0] = 0
+
+    def get(self, default=None):
+        with self.array.get_lock():
+            return self._read(default)
+
+    # raise the bound to value if it is higher
+    def raise_to(self, value):
+        with self.array.get_lock():
+            current = self._read()
+            if current is None or value > current:
+                self.array[1:] = list(value.to_bytes(self.SIZE, "little", signed=True))
+                self.array[0] = 1
+
+    def _read(self, default=None):
+        if not self.array[0]:
+            return default
+        return int.from_bytes(bytes(self.array[1:]), "little", signed=True)
+
+
+# state of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(bound, options, tt_size_mb, state_values):
+    _worker["bound"] = bound
+    _worker["engine"] = Negamax(state_values, TranspositionTable(tt_size_mb), **options)
+
+
+# search one root action of node until the time.monotonic deadline, return
+# (<action>, <value, None when out of time>, <exact>, <nodes>, <CPU seconds>)
+def _search_task(node, action, depth, deadline):
+    start = time.process_time()
+    engine = _worker["engine"]
+    engine.reset_stats()
+    engine.clock = time.monotonic
+    engine.deadline = deadline
+    alpha = _worker["bound"].get()
+    # the tasks of a chunk unpickle to the same node, and an abandoned search
+    # leaves its state undefined
+    node = copy.copy(node)
+    node.state = node.state.copy()
+    try:
+        value = engine.search_action(node, action, depth, alpha)
+    except SearchTimeout:
+        value = None
+    engine.deadline = None
+    # a value not above alpha is only an upper bound
+    exact = value is not None and (alpha is None or value > alpha)
+    if exact:
+        _worker["bound"].raise_to(value)
+    return action, value, exact, engine.nodes, time.process_time() - start
+
+
+class ParallelRoot:
+    """
+    Workers search with Negamax engines built from options, each with its
+    own transposition table of tt_size_mb. Scores must be integers.
+    """
+    def __init__(self, processes=2, tt_size_mb=16, state_values=None, **options):
+        self.processes = processes
+        self.bound = SharedBound()
+        self.pool = multiprocessing.Pool(processes, _init_worker,
+                                         (self.bound, options, tt_size_mb, state_values))
+        # CPU seconds and nodes of the workers since creation
+        self.worker_time = 0
+        self.worker_nodes = 0
+
+    # return the best root action of init_node at depth, engine searches
+    # the first action and keeps the score in engine.score
+    # budget: CPU seconds left for the whole search, shared by the workers
+    # running side by side; SearchTimeout when they run out
+    def search(self, engine, init_node, depth, budget=None):
+        start = time.process_time()
+        actions = engine.root_actions(init_node)
+        order = {action: i for i, action in enumerate(actions)}
+        self.bound.reset()
+        best = engine.search_action(init_node, actions[0], depth)
+        res = actions[0]
+        self.bound.raise_to(best)
+
+        timed_out = False
+        deadline = None
+        if budget is not None:
+            deadline = time.monotonic() + (budget - (time.process_time() - start)) / self.processes
+        tasks = [(init_node, action, depth, deadline) for action in actions[1:]]
+        for action, value, exact, nodes, seconds in self.pool.starmap(_search_task, tasks):
+            self.worker_time += seconds
+            self.worker_nodes += nodes
+            engine.nodes += nodes
+            if value is None:
+                timed_out = True
+            elif exact and (value > best or (value == best and order[action] < order[res])):
+                # a value that is not exact failed low, an upper bound no
+                # higher than best; ties go to the earlier action, as in the
+                # sequential search
+                best, res = value, action
+        if timed_out:
+            raise SearchTimeout()
+
+        engine.score = best
+        if engine.tt is not None:
+            engine.tt.store(init_node.state.key, depth, Bound.exact, best, res)
+        return res
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
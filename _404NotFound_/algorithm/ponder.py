@@ -0,0 +1,81 @@
+"""
+Pondering: searching on the opponent's time.
+After the player moves, a background process searches the position after
+the opponent's predicted reply, the best reply the player's own search
+stored in the transposition table, by iterative deepening on a
+SharedTranspositionTable the player searches with too. When the opponent
+plays the predicted reply the result is adopted, and the table already
+holds the pondered iterations; any other reply stops and discards it.
+"""
+import multiprocessing
+
+from _404NotFound_.algorithm.smp import _init_helper, _helper_task
+from _404NotFound_.algorithm.transposition import *
+
+
+class Ponderer:
+    """
+    tt: the SharedTranspositionTable the player searches with
+    The background search is a Negamax engine built from options; scores
+    must be integers.
+    """
+    def __init__(self, tt, state_values=None, **options):
+        self.tt = tt
+        self.stop = multiprocessing.Value("b", 0, lock=False)
+        self.pool = multiprocessing.Pool(1, _init_helper, (tt, self.stop, options, state_values))
+        # the running search, and the key of the position it searches
+        self.pending = None
+        self.key = None
+        # predictions the opponent played / did not play
+        self.hits = 0
+        self.misses = 0
+        # CPU seconds of the pondering of every hit, the search time the
+        # player did not have to spend
+        self.saved = []
+
+    # return the best reply of the player to move on board stored in the
+    # table, None when there is none
+    def predict(self, board):
+        entry = self.tt.probe(board.key ^ MIN_STAGE_KEY)
+        return None if entry is None else entry[4]
+
+    # ponder node, the position after the predicted reply, up to max_depth
+    def start(self, node, max_depth):
+        self.cancel()
+        self.stop.value = 0
+        self.key = node.state.key
+        self.pending = self.pool.apply_async(_helper_task, (node, 0, max_depth))
+
+    # stop the search unless the opponent's move led to board; it is
+    # counted as a hit or a miss
+    def check(self, board):
+        if self.pending is None:
+            return
+        if board.key == self.key:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.cancel()
+
+    # stop the search of a hit and return (<completed depth>, <action>,
+    # <score>, <CPU seconds>), None when nothing is pondered
+    def finish(self):
+        if self.pending is None:
+            return None
+        self.stop.value = 1
+        completed, action, score, nodes, seconds = self.pending.get()
+        self.pending = self.key = None
+        self.saved.append(seconds)
+        return completed, action, score, seconds
+
+    # stop the search and discard it
+    def cancel(self):
+        if self.pending is not None:
+            self.stop.value = 1
+            self.pending.wait()
+            self.pending = self.key = None
+
+    def close(self):
+        self.cancel()
+        self.pool.terminate()
+        self.pool.join()
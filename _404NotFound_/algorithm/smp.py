@@ -0,0 +1,91 @@
+"""
+Lazy SMP search over a process pool.
+Helper processes run the same iterative deepening search as the main
+process, all of them reading and writing one SharedTranspositionTable: the
+entries one search stores order and cut off the others, with no other
+synchronisation. Helpers start at staggered depths and rotate the root
+actions so they do not all search the same subtree first. The result is
+the one of the deepest completed iteration, the main search's on a tie.
+"""
+import copy
+import multiprocessing
+import time
+
+from _404NotFound_.algorithm.negamax import Negamax
+from _404NotFound_.algorithm.timer import SearchTimeout
+from _404NotFound_.algorithm.transposition import *
+
+
+# state of a helper process, set by _init_helper
+_helper = {}
+
+
+def _init_helper(tt, stop, options, state_values):
+    _helper["tt"] = tt
+    _helper["stop"] = stop
+    _helper["options"] = options
+    _helper["state_values"] = state_values
+
+
+# search node by iterative deepening up to max_depth until the stop flag is
+# set, return (<completed depth>, <action>, <score>, <nodes>, <CPU seconds>)
+def _helper_task(node, index, max_depth):
+    start = time.process_time()
+    engine = Negamax(_helper["state_values"], _helper["tt"], root_shift=index, **_helper["options"])
+    engine.stop = _helper["stop"]
+    try:
+        # every other helper starts one ply deeper
+        action = engine.iterative_deepening(node, max_depth, first_depth=min(max_depth, 1 + index % 2))
+    except SearchTimeout:
+        # stopped before its first iteration completed
+        action, engine.completed, engine.score = None, 0, None
+    return engine.completed, action, engine.score, engine.nodes, time.process_time() - start
+
+
+class LazySMP:
+    """
+    helpers: helper processes searching beside the main process
+    Helpers search with Negamax engines built from options on the shared
+    table tt, the main engine must use the same table. Scores must be
+    integers.
+    """
+    def __init__(self, helpers=1, tt_size_mb=16, state_values=None, **options):
+        self.helpers = helpers
+        self.tt = SharedTranspositionTable(tt_size_mb)
+        self.stop = multiprocessing.Value("b", 0, lock=False)
+        self.pool = multiprocessing.Pool(helpers, _init_helper,
+                                         (self.tt, self.stop, options, state_values))
+        # CPU seconds and nodes of the helpers since creation
+        self.worker_time = 0
+        self.worker_nodes = 0
+
+    # return the best action of init_node, engine runs the main iterative
+    # deepening search and keeps the score and depth of the result
+    # soft, hard: CPU seconds of iterative_deepening for all the processes,
+    # which run side by side
+    def search(self, engine, init_node, max_depth, soft=None, hard=None):
+        processes = self.helpers + 1
+        self.stop.value = 0
+        # the helpers get a copy, the main search changes init_node in place
+        # while the tasks are pickled
+        node = copy.copy(init_node)
+        node.state = init_node.state.copy()
+        pending = self.pool.starmap_async(_helper_task, [(node, index, max_depth)
+                                                         for index in range(1, processes)])
+        action = engine.iterative_deepening(init_node, max_depth,
+                                            None if soft is None else soft / processes,
+                                            None if hard is None else hard / processes)
+        self.stop.value = 1
+
+        completed, score = engine.completed, engine.score
+        for depth, helper_action, helper_score, nodes, seconds in pending.get():
+            self.worker_time += seconds
+            self.worker_nodes += nodes
+            if depth > completed:
+                completed, action, score = depth, helper_action, helper_score
+        engine.completed, engine.score = completed, score
+        return action
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
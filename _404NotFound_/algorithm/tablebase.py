@@ -0,0 +1,284 @@
+"""
+Endgame tablebase: every position with at most max_total_tokens tokens on
+the board, both sides together, solved by retrograde analysis into win /
+loss / draw with the distance in plies. The shipped table has 3: 1 against
+1 and 2 against 1.
+The positions of one material class (white tokens, black tokens) are
+indexed by <white placement> * <black placements> + <black placement>,
+times 2 for the side to move, and every position takes one signed byte:
++d the side to move wins in d plies, -d it loses in d plies, 0 a draw.
+The rules are the same for both colors, so only classes with at least as
+many white tokens as black are stored; the others are probed with the
+colors swapped.
+"""
+import mmap
+import struct
+from array import array
+
+from _404NotFound_.env.board import *
+
+MAGIC = b"EXTB"
+# magic, max total tokens, classes
+HEADER = struct.Struct("<4sBB")
+# white tokens, black tokens, offset of the values, white / black placements
+CLASS = struct.Struct("<BBIII")
+
+# longest distance a byte holds
+MAX_PLIES = 127
+
+
+# every placement of tokens tokens as stacks on the board from square
+# first on, as ((<square>, <stack>), ...) in square order
+def placements(tokens, first=0):
+    if not tokens:
+        return [()]
+    res = []
+    for square in range(first, BOARD_LEN ** 2):
+        for num in range(1, tokens + 1):
+            for rest in placements(tokens - num, square + 1):
+                res.append(((square, num),) + rest)
+    return res
+
+
+# placement of the tokens of the given sign in cells
+def placement(cells, sign):
+    return tuple((i, cells[i] * sign) for i in range(BOARD_LEN ** 2) if cells[i] * sign > 0)
+
+
+# every action of the side with placement own against other, booms of
+# stacks with no enemy next to them included, as (<action>, <own>, <other>)
+# placements after it
+def successors(own, other):
+    occupied = dict(own)
+    enemy = dict(other)
+    occupied.update(enemy)
+    for square, num in own:
+        # boom: the 8-connected component of square goes
+        chain = {square}
+        queue = [square]
+        while queue:
+            i = queue.pop()
+            for j in NEIGHBOURS[i]:
+                if j in occupied and j not in chain:
+                    chain.add(j)
+                    queue.append(j)
+        yield ("BOOM", COORDS[square]), \
+            tuple(stack for stack in own if stack[0] not in chain), \
+            tuple(stack for stack in other if stack[0] not in chain)
+        for target in CARD_NEIGHBOURS[square][num]:
+            if target in enemy:
+                continue
+            for _n in range(1, num + 1):
+                stacks = dict(own)
+                if num == _n:
+                    del stacks[square]
+                else:
+                    stacks[square] = num - _n
+                stacks[target] = stacks.get(target, 0) + _n
+                yield ("MOVE", _n, COORDS[square], COORDS[target]), tuple(sorted(stacks.items())), other
+
+
+class _Solver:
+    """ solves the classes of at most max_total_tokens tokens, fewest first """
+    def __init__(self, max_total_tokens):
+        self.max_total_tokens = max_total_tokens
+        self.placements = {t: placements(t) for t in range(1, max_total_tokens)}
+        self.index = {t: {p: i for i, p in enumerate(ps)} for t, ps in self.placements.items()}
+        # {(<white tokens>, <black tokens>): array of values}
+        self.values = {}
+
+    # value for the side to move of the position own / other, both sides
+    # with tokens in a solved class
+    def value(self, own, other):
+        own_tokens = sum(num for square, num in own)
+        other_tokens = sum(num for square, num in other)
+        if own_tokens >= other_tokens:
+            key, white, black, side = (own_tokens, other_tokens), own, other, 0
+        else:
+            key, white, black, side = (other_tokens, own_tokens), other, own, 1
+        nb = len(self.placements[key[1]])
+        return self.values[key][(self.index[key[0]][white] * nb + self.index[key[1]][black]) * 2 + side]
+
+    def solve(self):
+        classes = [(w, t - w) for t in range(2, self.max_total_tokens + 1) for w in range(t - 1, 0, -1) if w >= t - w]
+        for w, b in classes:
+            self.values[(w, b)] = self.solve_class(w, b)
+        return classes
+
+    # the outcome after an action, for the side that played it: (<win>,
+    # <plies>) or None for a draw; a finished game is (<win>, 1)
+    def outcome(self, own, other):
+        if not sum(num for square, num in own):
+            return (False, 1) if sum(num for square, num in other) else None
+        if not sum(num for square, num in other):
+            return True, 1
+        value = self.value(other, own)
+        if not value:
+            return None
+        return value < 0, abs(value) + 1
+
+    def solve_class(self, w, b):
+        whites, blacks = self.placements[w], self.placements[b]
+        nb = len(blacks)
+        size = len(whites) * nb * 2
+        # move successors in the class, as a flat array with offsets
+        offsets = array("i", [0])
+        children = array("i")
+        pending = array("i", bytes(4 * size))
+        longest = array("i", bytes(4 * size))
+        buckets = [[] for d in range(MAX_PLIES + 2)]
+        # positions with a winning boom: never lost, whatever their moves
+        # lead to
+        winning = bytearray(size)
+        valid = bytearray(size)
+        for wi, white in enumerate(whites):
+            white_squares = {square for square, num in white}
+            for bi, black in enumerate(blacks):
+                if any(square in white_squares for square, num in black):
+                    offsets.append(len(children))
+                    offsets.append(len(children))
+                    continue
+                for side in (0, 1):
+                    p = (wi * nb + bi) * 2 + side
+                    valid[p] = 1
+                    own, other = (white, black) if side == 0 else (black, white)
+                    best_win = None
+                    for action, own_after, other_after in successors(own, other):
+                        if action[0] == "MOVE":
+                            child_white, child_black = (own_after, other_after) if side == 0 else (other_after, own_after)
+                            children.append((self.index[w][child_white] * nb + self.index[b][child_black]) * 2 + 1 - side)
+                            pending[p] += 1
+                            continue
+                        result = self.outcome(own_after, other_after)
+                        if result is None:
+                            # a draw is always there, the position is never lost
+                            pending[p] += 1
+                        elif result[0]:
+                            best_win = result[1] if best_win is None else min(best_win, result[1])
+                        else:
+                            longest[p] = max(longest[p], result[1])
+                    if best_win is not None:
+                        winning[p] = 1
+                        buckets[best_win].append(p)
+                    elif not pending[p]:
+                        buckets[longest[p]].append(-p - 1)
+                    offsets.append(len(children))
+
+        # predecessors of every position by move actions
+        counts = array("i", bytes(4 * (size + 1)))
+        for child in children:
+            counts[child + 1] += 1
+        for p in range(size):
+            counts[p + 1] += counts[p]
+        fill = array("i", counts)
+        parents = array("i", bytes(4 * len(children)))
+        for p in range(size):
+            for k in range(offsets[p], offsets[p + 1]):
+                child = children[k]
+                parents[fill[child]] = p
+                fill[child] += 1
+
+        # resolve by distance: a win as soon as a child is lost, a loss
+        # when the last child is won; bucket entries are p for a win and
+        # -p - 1 for a loss
+        values = array("b", bytes(size))
+        resolved = bytearray(size)
+        for d in range(1, MAX_PLIES + 1):
+            for entry in buckets[d]:
+                p, win = (entry, True) if entry >= 0 else (-entry - 1, False)
+                if resolved[p]:
+                    continue
+                resolved[p] = 1
+                values[p] = d if win else -d
+                for k in range(counts[p], counts[p + 1]):
+                    parent = parents[k]
+                    if resolved[parent]:
+                        continue
+                    if not win:
+                        buckets[d + 1].append(parent)
+                    else:
+                        pending[parent] -= 1
+                        longest[parent] = max(longest[parent], d + 1)
+                        if not pending[parent] and not winning[parent]:
+                            buckets[longest[parent]].append(-parent - 1)
+        if buckets[MAX_PLIES + 1]:
+            raise ValueError("distance over {} plies".format(MAX_PLIES))
+        return values
+
+
+# solve every position with at most max_total_tokens tokens on the board
+# and write the tablebase to path
+def build_tablebase(path, max_total_tokens=3):
+    solver = _Solver(max_total_tokens)
+    classes = solver.solve()
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, max_total_tokens, len(classes)))
+        offset = HEADER.size + CLASS.size * len(classes)
+        for w, b in classes:
+            file.write(CLASS.pack(w, b, offset, len(solver.placements[w]), len(solver.placements[b])))
+            offset += len(solver.values[(w, b)])
+        for w, b in classes:
+            file.write(solver.values[(w, b)].tobytes())
+    return solver
+
+
+class Tablebase:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.max_total_tokens, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a tablebase".format(path))
+        # {(<white tokens>, <black tokens>): (<offset>, <black placements>)}
+        self.classes = {}
+        for k in range(count):
+            w, b, offset, nw, nb = CLASS.unpack_from(self.data, HEADER.size + k * CLASS.size)
+            self.classes[(w, b)] = (offset, nb)
+        self.index = {t: {p: i for i, p in enumerate(placements(t))} for t in range(1, self.max_total_tokens)}
+
+    # reopened by path in another process
+    def __reduce__(self):
+        return Tablebase, (self.path,)
+
+    # return the value for color to move on board: +d wins in d plies, -d
+    # loses in d plies, 0 a draw; None when the position is not in it
+    def probe(self, board, color):
+        white_tokens = board.count_tokens(Color.white)
+        black_tokens = board.count_tokens(Color.black)
+        if not white_tokens or not black_tokens or white_tokens + black_tokens > self.max_total_tokens:
+            return None
+        cells = board.cells
+        white, black = placement(cells, 1), placement(cells, -1)
+        side = 0 if color == Color.white else 1
+        if white_tokens < black_tokens:
+            white_tokens, black_tokens, white, black, side = black_tokens, white_tokens, black, white, 1 - side
+        offset, nb = self.classes[(white_tokens, black_tokens)]
+        value = self.data[offset + (self.index[white_tokens][white] * nb + self.index[black_tokens][black]) * 2 + side]
+        return value - 256 if value > MAX_PLIES else value
+
+    # return (<action>, <value>) of the best action for color on board, the
+    # shortest win, else a draw, else the longest loss; None when the
+    # position is not in it
+    def best_action(self, board, color):
+        if self.probe(board, color) is None:
+            return None
+        sign = color.value
+        cells = board.cells
+        best = None
+        for action, own, other in successors(placement(cells, sign), placement(cells, -sign)):
+            own_tokens = sum(num for square, num in own)
+            other_tokens = sum(num for square, num in other)
+            if not other_tokens:
+                value = 1 if own_tokens else 0
+            elif not own_tokens:
+                value = -1
+            else:
+                child = board.apply_action(action)
+                value = -self.probe(child, opposite(color))
+                value = value + 1 if value > 0 else value - 1 if value < 0 else 0
+            # rank: wins by fewest plies, draws, losses by most plies
+            rank = (2, -value) if value > 0 else (1, 0) if value == 0 else (0, -value)
+            if best is None or rank > best[0]:
+                best = (rank, action, value)
+        return best[1], best[2]
@@ -0,0 +1,172 @@
+"""
+Search telemetry: per move statistics of the search.
+TimedNode wraps the root node of a search and TimedValues the RL state
+values, adding the time of every call to a PhaseTimes: move generation,
+make / unmake (or successors, which apply every action to a copy),
+evaluation and state value probes. TelemetryLog turns the counters of the
+engine and the phase times of a move into one record, kept in memory and
+optionally appended to a file as a JSON line.
+Phases are timed in CPU time like the move, so what the phases leave of
+the move's time is the engine's own work. The timing adds about 40% to
+the search, so telemetry is off unless asked for.
+"""
+import copy
+import json
+import time
+from collections.abc import Mapping
+
+PHASES = ("movegen", "make", "evaluation", "state_values")
+
+
+class PhaseTimes:
+    def __init__(self):
+        # {<phase>: <seconds>} and {<phase>: <calls>}
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+
+class TimedNode:
+    """
+    node: the node searched, every other attribute is the node's
+    Children made by successors are wrapped too.
+    """
+    def __init__(self, node, times):
+        self.node = node
+        self.times = times
+
+    # copied with a copy of the node, as lazy SMP copies the root
+    def __copy__(self):
+        return TimedNode(copy.copy(self.node), self.times)
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "node":
+            raise AttributeError(name)
+        return getattr(self.node, name)
+
+    @property
+    def state(self):
+        return self.node.state
+
+    @state.setter
+    def state(self, state):
+        self.node.state = state
+
+    def actions(self, minimax_stage):
+        start = time.process_time()
+        # generated in full here, not while the search iterates them
+        actions = list(self.node.actions(minimax_stage))
+        self.times.add("movegen", time.process_time() - start)
+        return actions
+
+    def captures(self, minimax_stage):
+        start = time.process_time()
+        actions = list(self.node.captures(minimax_stage))
+        self.times.add("movegen", time.process_time() - start)
+        return actions
+
+    def make(self, action):
+        start = time.process_time()
+        token = self.node.make(action)
+        self.times.add("make", time.process_time() - start)
+        return token
+
+    def unmake(self, token):
+        start = time.process_time()
+        self.node.unmake(token)
+        self.times.add("make", time.process_time() - start)
+
+    def successors(self, minimax_stage):
+        children = self.node.successors(minimax_stage)
+        while True:
+            start = time.process_time()
+            child = next(children, None)
+            self.times.add("make", time.process_time() - start)
+            if child is None:
+                return
+            yield TimedNode(child, self.times)
+
+    def evaluation(self):
+        start = time.process_time()
+        value = self.node.evaluation()
+        self.times.add("evaluation", time.process_time() - start)
+        return value
+
+    def child_evaluations(self, actions):
+        start = time.process_time()
+        values = self.node.child_evaluations(actions)
+        self.times.add("evaluation", time.process_time() - start)
+        return values
+
+    def __lt__(self, other):
+        return self.evaluation() < other.evaluation()
+
+
+class TimedValues(Mapping):
+    """ read only view of a state value table timing every probe """
+    def __init__(self, state_values, times):
+        self.state_values = state_values
+        self.times = times
+
+    def __contains__(self, key):
+        start = time.process_time()
+        found = key in self.state_values
+        self.times.add("state_values", time.process_time() - start)
+        return found
+
+    def __getitem__(self, key):
+        return self.state_values[key]
+
+    def __iter__(self):
+        return iter(self.state_values)
+
+    def __len__(self):
+        return len(self.state_values)
+
+
+class TelemetryLog:
+    """
+    path: optional file the records are appended to as JSON lines
+    records: the record of every move, in order
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+
+    # add and return the record of a move: fields, then for a search the
+    # engine's statistics and the phase times; seconds is the CPU time of
+    # the move
+    def record(self, seconds, engine=None, times=None, **fields):
+        record = dict(fields)
+        record["seconds"] = seconds
+        if engine is not None:
+            stats = engine.stats()
+            cutoffs = sum(stats["cutoffs_per_ply"])
+            record.update({
+                "depth": engine.completed,
+                "nodes": stats["nodes"],
+                "qnodes": stats["qnodes"],
+                "nodes_per_depth": stats["nodes_per_depth"],
+                "nodes_per_ply": stats["nodes_per_ply"],
+                "nps": stats["nodes"] / seconds if seconds else 0,
+                "cutoff_rate": cutoffs / stats["interior"] if stats["interior"] else 0,
+                "first_cutoff_rate": stats["first_cutoff_rate"],
+                "ebf": stats["ebf"],
+                "duplicates_skipped": stats["duplicates_skipped"],
+            })
+            if engine.tt is not None:
+                record["tt_hit_rate"] = engine.tt.hit_rate()
+        if times is not None:
+            record["phases"] = dict(times.seconds)
+            record["phase_calls"] = dict(times.calls)
+            # what the search spent outside the node calls: ordering, the
+            # transposition table and the engine itself
+            record["phases"]["other"] = max(0.0, seconds - sum(times.seconds.values()))
+        self.records.append(record)
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+        return record
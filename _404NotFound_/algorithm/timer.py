@@ -0,0 +1,50 @@
+"""
+CPU time management for the search.
+The referee charges a player the CPU time of its __init__, action and update
+calls against one budget for the whole game, and ends the game as a draw
+after 250 turns per player.
+"""
+import time
+
+
+class SearchTimeout(Exception):
+    """ raised inside a search that ran past its deadline """
+
+
+class TimeManager:
+    """
+    budget: CPU seconds for the whole game
+    max_turns: turns per player before the game is drawn
+    horizon: the most turns the rest of the budget is spread over, games
+        rarely get near max_turns
+    reserve: fraction of the budget never allocated
+    """
+    def __init__(self, budget=60, max_turns=250, horizon=40, reserve=0.1):
+        self.budget = budget
+        self.max_turns = max_turns
+        self.horizon = horizon
+        self.reserve = reserve
+        # CPU seconds charged so far and turns played
+        self.used = 0
+        self.turns = 0
+        self.started = None
+
+    # charge the CPU time between start and stop to the budget
+    def start(self):
+        self.started = time.process_time()
+
+    def stop(self):
+        self.used += time.process_time() - self.started
+        self.started = None
+
+    def remaining(self):
+        return max(0, self.budget * (1 - self.reserve) - self.used)
+
+    # return (<soft>, <hard>) seconds for the next turn: no new iteration is
+    # started after soft, a running one is abandoned at hard
+    def allocate(self):
+        remaining = self.remaining()
+        turns_left = max(1, min(self.max_turns - self.turns, self.horizon))
+        soft = remaining / turns_left
+        hard = min(remaining / 2, soft * 4)
+        return soft, hard
@@ -0,0 +1,206 @@
+"""
+A bounded transposition table for the alpha-beta search.
+Each bucket has two slots: a depth-preferred slot that keeps the deepest
+search of a position and an always-replace slot for the most recent one.
+SharedTranspositionTable keeps the same buckets in shared memory, so the
+processes of a parallel search read and write one table without locks.
+"""
+from enum import Enum
+from multiprocessing import shared_memory
+import weakref
+
+
+class Bound(Enum):
+    exact = 0
+    lower = 1
+    upper = 2
+
+
+# rough size of one entry in CPython (tuple, int key, score tuple, action)
+ENTRY_BYTES = 256
+
+# xor-ed into the key of positions searched with the opponent to move
+MIN_STAGE_KEY = 0x9E3779B97F4A7C15
+
+
+class TranspositionTable:
+    # entry: (<key>, <depth>, <Bound>, <score>, <best action>)
+    def __init__(self, size_mb=16):
+        self.size = max(1, size_mb * 2 ** 20 // ENTRY_BYTES // 2)
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def probe(self, key):
+        self.probes += 1
+        index = key % self.size
+        entry = self.deep[index]
+        if entry is None or entry[0] != key:
+            entry = self.recent[index]
+            if entry is None or entry[0] != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, bound, score, action):
+        self.stores += 1
+        index = key % self.size
+        entry = (key, depth, bound, score, action)
+        deep = self.deep[index]
+        if deep is None or deep[0] == key or depth >= deep[1]:
+            self.deep[index] = entry
+        else:
+            self.recent[index] = entry
+
+    def clear(self):
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+
+    def reset_stats(self):
+        self.probes = self.hits = self.cutoffs = self.stores = 0
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0
+
+    def stats(self):
+        return {"probes": self.probes, "hits": self.hits, "hit_rate": self.hit_rate(),
+                "cutoffs": self.cutoffs, "stores": self.stores}
+
+
+# bounds and actions of the shared table as small integers
+BOUND_CODES = {Bound.exact: 1, Bound.lower: 2, Bound.upper: 3}
+CODE_BOUNDS = {code: bound for bound, code in BOUND_CODES.items()}
+
+
+# action as 18 bits: <kind, 1 MOVE, 2 BOOM> <n: 4> <from cell: 6> <to cell: 6>,
+# 0 for None
+def encode_action(action):
+    if action is None:
+        return 0
+    if action[0] == "MOVE":
+        (xa, ya), (xb, yb) = action[2], action[3]
+        return 1 << 16 | action[1] << 12 | (ya * 8 + xa) << 6 | yb * 8 + xb
+    x, y = action[1]
+    return 2 << 16 | (y * 8 + x) << 6
+
+
+def decode_action(code):
+    kind, _from, _to = code >> 16, code >> 6 & 63, code & 63
+    if kind == 1:
+        return ("MOVE", code >> 12 & 15, (_from % 8, _from // 8), (_to % 8, _to // 8))
+    if kind == 2:
+        return ("BOOM", (_from % 8, _from // 8))
+    return None
+
+
+def _release(shm, words, owner):
+    words.release()
+    shm.close()
+    if owner:
+        shm.unlink()
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    The two slot buckets in a multiprocessing.shared_memory block, for
+    integer scores below 2 ** 95 and Expendibots actions. An entry is three
+    64-bit words <check> <score low bits> <meta>, meta packing the bound,
+    depth, action and the score's high bits. Writers store check = key ^ low
+    ^ meta last, so an entry torn by another process fails the check and
+    reads as a miss. Pickled, the table attaches to the same block; the
+    process that created it unlinks the block when it is collected.
+    """
+    WORDS = 3
+
+    def __init__(self, size_mb=16, name=None):
+        self.size_mb = size_mb
+        self.size = max(1, size_mb * 2 ** 20 // (16 * self.WORDS))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.size * 16 * self.WORDS)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.words = self.shm.buf.cast("Q")
+        weakref.finalize(self, _release, self.shm, self.words, name is None)
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def __reduce__(self):
+        return SharedTranspositionTable, (self.size_mb, self.shm.name)
+
+    # the verified entry at word i, None when empty, torn or for another key
+    def _read(self, i, key):
+        words = self.words
+        check, low, meta = words[i], words[i + 1], words[i + 2]
+        if not meta or check ^ low ^ meta != key:
+            return None
+        high = meta >> 28
+        if high >= 1 << 31:
+            high -= 1 << 32
+        return key, meta >> 2 & 255, CODE_BOUNDS[meta & 3], high << 64 | low, decode_action(meta >> 10 & 0x3ffff)
+
+    def probe(self, key):
+        self.probes += 1
+        i = key % self.size * 2 * self.WORDS
+        entry = self._read(i, key) or self._read(i + self.WORDS, key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def store(self, key, depth, bound, score, action):
+        self.stores += 1
+        i = key % self.size * 2 * self.WORDS
+        # the deep slot read under its own key, whatever that is
+        deep = self._read(i, self.words[i] ^ self.words[i + 1] ^ self.words[i + 2])
+        if deep is not None and deep[0] != key and depth < deep[1]:
+            i += self.WORDS
+        low = score & (1 << 64) - 1
+        meta = ((score >> 64) & (1 << 32) - 1) << 28 | encode_action(action) << 10 \
+            | min(depth, 255) << 2 | BOUND_CODES[bound]
+        words = self.words
+        words[i] = 0
+        words[i + 1] = low
+        words[i + 2] = meta
+        words[i] = key ^ low ^ meta
+
+    def clear(self):
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+
+
+# return the stored score if the entry settles the node for window (a, b),
+# a / b are None when unbounded
+def tt_cutoff(tt, entry, depth, a, b):
+    if entry is None or entry[1] < depth:
+        return None
+    bound, score = entry[2], entry[3]
+    if bound == Bound.exact or \
+            (bound == Bound.lower and b is not None and score >= b) or \
+            (bound == Bound.upper and a is not None and score <= a):
+        tt.cutoffs += 1
+        return score
+    return None
+
+
+# bound type of a fail-hard search result for the original window (a, b)
+def tt_bound(value, a, b):
+    if b is not None and value >= b:
+        return Bound.lower
+    if a is not None and value <= a:
+        return Bound.upper
+    return Bound.exact
+
+
+# move the stored best action to the front of the action list
+def tt_order(actions, entry):
+    if entry is None or entry[4] is None:
+        return actions
+    actions = list(actions)
+    if entry[4] in actions:
+        actions.remove(entry[4])
+        actions.insert(0, entry[4])
+    return actions
+
@@ -0,0 +1,472 @@
+"""
+Benchmarks for the search engine.
+Run with: python -m _404NotFound_.benchmark <name> [depth]
+Time is measured as CPU time, the same way the referee does.
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from _404NotFound_.algorithm.evalcache import EvaluationCache
+from _404NotFound_.algorithm.minimax import *
+from _404NotFound_.algorithm.negamax import Negamax
+from _404NotFound_.algorithm.parallel import ParallelRoot
+from _404NotFound_.algorithm.smp import LazySMP
+from _404NotFound_.algorithm.transposition import TranspositionTable
+from _404NotFound_.env.batch import np, board_array, batch_features
+from _404NotFound_.env.board import *
+from _404NotFound_.env.bitboard import BitBoard
+from _404NotFound_.player import Minimax_Node, Scalar_Node, Player, ASPIRATION, pack_score
+
+
+# midgame positions, as the actions played from the opening position
+# (white moves first), taken from games of Player against Greedy
+_GAME_1 = [("MOVE", 1, (0, 0), (0, 1)), ("MOVE", 1, (1, 6), (1, 7)), ("MOVE", 2, (0, 1), (0, 3)),
+           ("MOVE", 1, (7, 6), (6, 6)), ("MOVE", 1, (0, 3), (0, 5)), ("MOVE", 1, (0, 6), (0, 7)),
+           ("MOVE", 1, (0, 5), (0, 6)), ("MOVE", 2, (1, 7), (3, 7)), ("BOOM", (0, 6)),
+           ("MOVE", 1, (3, 7), (1, 7)), ("MOVE", 1, (3, 0), (3, 1)), ("MOVE", 2, (6, 6), (7, 6))]
+_GAME_2 = [("MOVE", 1, (0, 0), (0, 1)), ("MOVE", 1, (0, 7), (1, 7)), ("MOVE", 2, (0, 1), (0, 3)),
+           ("MOVE", 1, (1, 6), (1, 5)), ("MOVE", 1, (0, 3), (0, 5)), ("MOVE", 1, (0, 6), (0, 7)),
+           ("MOVE", 1, (0, 5), (0, 6)), ("MOVE", 2, (1, 7), (3, 7)), ("BOOM", (0, 6)),
+           ("MOVE", 1, (3, 7), (2, 7)), ("MOVE", 1, (3, 0), (3, 1)), ("MOVE", 1, (4, 6), (3, 6)),
+           ("MOVE", 2, (3, 1), (3, 3)), ("MOVE", 1, (3, 6), (3, 4))]
+_GAME_3 = [("MOVE", 1, (0, 0), (0, 1)), ("MOVE", 1, (3, 6), (3, 7)), ("MOVE", 2, (0, 1), (0, 3)),
+           ("MOVE", 1, (6, 7), (6, 6)), ("MOVE", 1, (0, 3), (0, 5)), ("MOVE", 1, (6, 6), (6, 7)),
+           ("MOVE", 1, (3, 0), (3, 1)), ("MOVE", 1, (1, 7), (1, 6)), ("BOOM", (0, 5)),
+           ("MOVE", 2, (3, 7), (3, 6)), ("MOVE", 2, (3, 1), (3, 3)), ("MOVE", 1, (3, 6), (3, 4)),
+           ("MOVE", 1, (3, 3), (3, 5)), ("MOVE", 1, (7, 7), (6, 7)), ("BOOM", (3, 3)),
+           ("MOVE", 1, (6, 6), (6, 5)), ("MOVE", 1, (6, 0), (6, 1)), ("MOVE", 1, (6, 5), (5, 5)),
+           ("MOVE", 2, (6, 1), (6, 3)), ("MOVE", 1, (7, 6), (7, 7))]
+MIDGAME = [_GAME_1, _GAME_2, _GAME_3[:16], _GAME_3]
+
+
+def midgame_positions(board_class=Board):
+    """ yield (<board>, <color to move>) for every MIDGAME position """
+    for actions in MIDGAME:
+        board = board_class(True)
+        for action in actions:
+            board = board.apply_action(action)
+        yield board, Color.white if len(actions) % 2 == 0 else Color.black
+
+
+class Counting_Node(Minimax_Node):
+    # number of nodes visited since the last reset
+    count = 0
+
+    def __init__(self, board, color, action=None, cache=None, tablebase=None):
+        super().__init__(board, color, action, cache, tablebase)
+        Counting_Node.count += 1
+
+    def make(self, action):
+        Counting_Node.count += 1
+        return super().make(action)
+
+
+def search(board, depth, color=Color.white, inplace=False, tt=None):
+    """ run one minimax decision, return (action, nodes, seconds) """
+    node = Counting_Node(board.copy(), color)
+    Counting_Node.count = 0
+    start = time.process_time()
+    if inplace:
+        action = minimax_decision_inplace(node, depth, {}, tt)
+    else:
+        action = minimax_decision(node, depth, {}, tt)
+    elapsed = time.process_time() - start
+    return action, Counting_Node.count, elapsed
+
+
+def negamax_search(board, depth, color=Color.white, inplace=False, tt=None, ordering=True, quiescence=0):
+    """ run one negamax search, return (action, nodes, seconds, engine) """
+    node = Minimax_Node(board.copy(), color)
+    engine = Negamax(tt=tt, inplace=inplace, ordering=ordering, quiescence=quiescence)
+    start = time.process_time()
+    action = engine.search(node, depth)
+    elapsed = time.process_time() - start
+    return action, engine.nodes, elapsed, engine
+
+
+class Call_Counter:
+    """ context manager counting the calls of a method of some classes """
+    def __init__(self, method, *classes):
+        self.method = method
+        self.classes = classes
+        self.count = 0
+
+    def __enter__(self):
+        def counting(function):
+            def wrapper(*args, **kwargs):
+                self.count += 1
+                return function(*args, **kwargs)
+            return wrapper
+        self.saved = [cls.__dict__[self.method] for cls in self.classes]
+        for cls, function in zip(self.classes, self.saved):
+            setattr(cls, self.method, counting(function))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for cls, function in zip(self.classes, self.saved):
+            setattr(cls, self.method, function)
+
+
+def report(name, action, nodes, elapsed):
+    print("{:<12}{:>10}{:>10.3f}s{:>12.0f} nodes/s  {}".format(
+        name, nodes, elapsed, nodes / elapsed if elapsed else 0, action))
+
+
+# nodes/second of the Board and BitBoard engines from the opening position
+def bench_board(depth=3):
+    print("depth {} from the opening position".format(depth))
+    for name, board in (("Board", Board(True)), ("BitBoard", BitBoard(True))):
+        report(name, *search(board, depth))
+
+
+# copy per successor against make / unmake, with allocation figures:
+# copies: boards copied during the search
+# peak: peak traced memory of a second, tracemalloc instrumented run
+def bench_inplace(depth=3):
+    print("depth {} from the opening position".format(depth))
+    for name, board in (("Board", Board(True)), ("BitBoard", BitBoard(True))):
+        for inplace in (False, True):
+            gc.collect()
+            with Call_Counter("copy", Board, BitBoard) as copies:
+                result = search(board, depth, inplace=inplace)
+            tracemalloc.start()
+            search(board, depth, inplace=inplace)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report(name + (" make" if inplace else " copy"), *result)
+            print("{:<12}{:>10} copies{:>10.1f}KB peak".format("", copies.count, peak / 1024))
+
+
+# make / unmake search with and without a transposition table
+def bench_tt(depth=3, size_mb=16):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        report("no tt", *search(board, depth, color, inplace=True))
+        tt = TranspositionTable(size_mb)
+        report("tt", *search(board, depth, color, inplace=True, tt=tt))
+        print("{:<12}{:>10} probes{:>8.1%} hits{:>8} cutoffs".format(
+            "", tt.probes, tt.hit_rate(), tt.cutoffs))
+
+
+# the flood fill and move generation written with Pos generators, as they
+# were before the lookup tables, kept as the baseline for bench_tables
+def pos_boom_component(board):
+    mark = [False for i in range(BOARD_LEN ** 2)]
+    boom_component = {Color.white:[], Color.black:[]}
+    for x in range(BOARD_LEN):
+        for y in range(BOARD_LEN):
+            if not mark[y*BOARD_LEN+x] and not board.is_blank(x, y):
+                queue = [Pos(x, y)]
+                mark[y*BOARD_LEN+x] = True
+                black = 0
+                white = 0
+                while queue:
+                    pos = queue.pop()
+                    if board.get_color(pos.x, pos.y) == Color.white:
+                        white += board.get_num(pos.x, pos.y)
+                    else:
+                        black += board.get_num(pos.x, pos.y)
+                    for neighbour in pos.neighbour():
+                        if not mark[neighbour.y*BOARD_LEN+neighbour.x]:
+                            mark[neighbour.y*BOARD_LEN+neighbour.x] = True
+                            if not board.is_blank(neighbour.x, neighbour.y):
+                                queue.append(neighbour)
+                if white > 0 and black > 0:
+                    boom_component[Color.white].append(white)
+                    boom_component[Color.black].append(black)
+    return boom_component
+
+
+def pos_actions(board, color):
+    actions = []
+    pieces = board.get_pieces(color)
+    for pos, num in pieces:
+        if [1 for _p in pos.neighbour() if board.is_color(_p.x, _p.y, opposite(color))]:
+            actions.append(("BOOM", (pos.x, pos.y)))
+    for pos, num in pieces:
+        for _p in pos.card_neighbour(num):
+            if board.get_color(_p.x, _p.y) == opposite(color):
+                continue
+            for _n in range(1, num+1):
+                actions.append(("MOVE", _n, (pos.x, pos.y), (_p.x, _p.y)))
+    map = [0 for i in range(BOARD_LEN**2)]
+    for x in range(BOARD_LEN):
+        for y in range(BOARD_LEN):
+            count = 0
+            for neighbour in Pos(x, y).neighbour():
+                if board.get_color(neighbour.x, neighbour.y) == opposite(color):
+                    count += 1
+            map[y*BOARD_LEN + x] = count
+    return actions
+
+
+def timed(function, repeat):
+    start = time.process_time()
+    for i in range(repeat):
+        function()
+    return (time.process_time() - start) / repeat
+
+
+# flood fill and move generation with Pos generators against lookup tables
+def bench_tables(repeat=200):
+    print("{:<24}{:>14}{:>14}{:>10}".format("", "Pos generator", "table", "speedup"))
+    for i, (board, color) in enumerate(midgame_positions()):
+        for name, old, new in (
+                ("flood fill", lambda: pos_boom_component(board), board.get_boom_component),
+                ("movegen", lambda: pos_actions(board, color), lambda: list(board.all_possible_actions(color)))):
+            old_time = timed(old, repeat)
+            new_time = timed(new, repeat)
+            print("{:<24}{:>12.1f}us{:>12.1f}us{:>9.1f}x".format(
+                "position {} {}".format(i, name), old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+# Pos objects allocated by a make / unmake search on the midgame suite
+def bench_squares(depth=3):
+    for i, (board, color) in enumerate(midgame_positions()):
+        with Call_Counter("__init__", Pos) as allocations:
+            result = search(board, depth, color, inplace=True)
+        report("position {}".format(i), *result)
+        print("{:<12}{:>10} Pos objects".format("", allocations.count))
+
+
+# a full component flood against reading the incrementally kept components
+def bench_components(repeat=2000):
+    print("{:<24}{:>14}{:>14}{:>10}".format("", "flood", "incremental", "speedup"))
+    for i, (board, color) in enumerate(midgame_positions()):
+        def flood():
+            board.copy().build_components()
+            return board.get_boom_component()
+        old_time = timed(flood, repeat) - timed(board.copy, repeat)
+        new_time = timed(board.get_boom_component, repeat)
+        print("{:<24}{:>12.1f}us{:>12.1f}us{:>9.1f}x".format(
+            "position {}".format(i), old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+# search with every boom against one boom per component
+def bench_dedup(depth=3):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        Board.unique_booms = False
+        report("all booms", *search(board, depth, color, inplace=True))
+        Board.unique_booms = True
+        Board.duplicates_skipped = 0
+        report("unique", *search(board, depth, color, inplace=True))
+        print("{:<12}{:>10} duplicate booms skipped".format("", Board.duplicates_skipped))
+
+
+# nodes searched by minimax against negamax with -inf / +inf bounds
+def bench_negamax(depth=3):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        old = search(board, depth, color, inplace=True)
+        report("minimax", *old)
+        *new, engine = negamax_search(board, depth, color, inplace=True, ordering=False)
+        report("negamax", *new)
+        stats = engine.stats()
+        print("{:<12}{:>10} cutoffs{:>8.1%} first{:>8.2f} ebf  {}".format(
+            "", sum(stats["cutoffs_per_ply"]), stats["first_cutoff_rate"], stats["ebf"],
+            "same action" if old[0] == new[0] else "DIFFERENT ACTION"))
+
+
+# nodes searched with the board's action order against tt action,
+# captures, killers and history, with and without a transposition table
+def bench_ordering(depth=3):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        for tt in (False, True):
+            scores = []
+            for ordering in (False, True):
+                *result, engine = negamax_search(board, depth, color, inplace=True, ordering=ordering,
+                                                 tt=TranspositionTable() if tt else None)
+                report(("tt " if tt else "") + ("ordered" if ordering else "board"), *result)
+                scores.append(engine.score)
+            print("{:<12}{:>10}".format("", "same score" if scores[0] == scores[1] else "DIFFERENT SCORE"))
+
+
+# a full width search with and without quiescence, against one more full
+# width ply
+def bench_quiescence(depth=2, plies=4):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, {} to move".format(i, color.name))
+        deeper = negamax_search(board, depth + 1, color, inplace=True)
+        for name, result in (("depth {}".format(depth), negamax_search(board, depth, color, inplace=True)),
+                             ("depth {}+q".format(depth), negamax_search(board, depth, color, inplace=True,
+                                                                          quiescence=plies)),
+                             ("depth {}".format(depth + 1), deeper)):
+            *result, engine = result
+            report(name, *result)
+            print("{:<12}{:>10} quiescence{:>8} delta pruned  {}".format(
+                "", engine.qnodes, engine.delta_pruned,
+                "same action as depth {}".format(depth + 1) if result[0] == deeper[0] else ""))
+
+
+# iterative deepening to depth with a transposition table: alpha-beta on
+# tuple and on packed scores, principal variation search, and principal
+# variation search with aspiration windows
+def bench_pvs(depth=4):
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        scores = set()
+        for name, node_class, options in (("tuple", Minimax_Node, {}),
+                                          ("alpha-beta", Scalar_Node, {}),
+                                          ("pvs", Scalar_Node, {"pvs": True}),
+                                          ("pvs+asp", Scalar_Node, {"pvs": True, "aspiration": ASPIRATION})):
+            engine = Negamax(tt=TranspositionTable(), inplace=True, **options)
+            start = time.process_time()
+            action = engine.iterative_deepening(node_class(board.copy(), color), depth)
+            report(name, action, engine.nodes, time.process_time() - start)
+            if options:
+                print("{:<12}{:>10} re-searches{:>6} aspiration fails".format(
+                    "", engine.researches, engine.aspiration_fails))
+            scores.add(engine.score if node_class is Scalar_Node else pack_score(engine.score))
+        print("{:<12}{:>10}".format("", "same score" if len(scores) == 1 else "DIFFERENT SCORES"))
+
+
+# iterative deepening in one process against the parallel root search,
+# with the CPU time of the parent and the workers and the wall time
+def bench_parallel(depth=4, processes=2):
+    parallel = ParallelRoot(processes, inplace=True, pvs=True)
+    print("{:<12}{:>10}{:>10}{:>10}{:>10}".format("", "nodes", "parent", "workers", "wall"))
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        for name, pool in (("sequential", None), ("{} workers".format(processes), parallel)):
+            engine = Negamax(tt=TranspositionTable(), inplace=True, pvs=True, parallel=pool)
+            worker_time = parallel.worker_time
+            start, wall = time.process_time(), time.perf_counter()
+            action = engine.iterative_deepening(Scalar_Node(board.copy(), color), depth)
+            print("{:<12}{:>10}{:>9.3f}s{:>9.3f}s{:>9.3f}s  {}".format(
+                name, engine.nodes, time.process_time() - start, parallel.worker_time - worker_time,
+                time.perf_counter() - wall, action))
+    parallel.close()
+
+
+# iterative deepening in one process against lazy SMP with helpers, both
+# given seconds of CPU time in all, with the deepest completed iteration
+def bench_smp(seconds=2, helpers=2):
+    smp = LazySMP(helpers, inplace=True, pvs=True)
+    print("{:<12}{:>10}{:>10}{:>10}".format("", "depth", "nodes", "wall"))
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, {}s, {} to move".format(i, seconds, color.name))
+        for name, pool in (("sequential", None), ("{} helpers".format(helpers), smp)):
+            tt = smp.tt if pool else TranspositionTable()
+            tt.clear()
+            engine = Negamax(tt=tt, inplace=True, pvs=True)
+            worker_nodes = smp.worker_nodes
+            wall = time.perf_counter()
+            if pool:
+                action = smp.search(engine, Scalar_Node(board.copy(), color), 20, seconds, seconds)
+            else:
+                action = engine.iterative_deepening(Scalar_Node(board.copy(), color), 20, seconds, seconds)
+            print("{:<12}{:>10}{:>10}{:>9.3f}s  {}".format(
+                name, engine.completed, engine.nodes + smp.worker_nodes - worker_nodes,
+                time.perf_counter() - wall, action))
+    smp.close()
+
+
+# iterative deepening to depth without and with an evaluation cache, then
+# again with the filled cache and a new transposition table, as when the
+# next turn searches the positions of this one
+def bench_evalcache(depth=4):
+    print("{:<12}{:>10}{:>10}{:>10}{:>10}".format("", "nodes", "hits", "misses", "time"))
+    for i, (board, color) in enumerate(midgame_positions()):
+        print("midgame position {}, depth {}, {} to move".format(i, depth, color.name))
+        cache = EvaluationCache()
+        for name, node_cache in (("no cache", None), ("cache", cache), ("next turn", cache)):
+            cache.reset_stats()
+            engine = Negamax(tt=TranspositionTable(), inplace=True, pvs=True)
+            start = time.process_time()
+            action = engine.iterative_deepening(Scalar_Node(board.copy(), color, cache=node_cache), depth)
+            hits, misses = (cache.hits, cache.misses) if node_cache else ("", "")
+            print("{:<12}{:>10}{:>10}{:>10}{:>9.3f}s  {}".format(
+                name, engine.nodes, hits, misses, time.process_time() - start, action))
+
+
+# evaluation of the children of each position one by one against one
+# batch, then iterative deepening to depth with and without evaluating the
+# children of depth 1 nodes in batches
+def bench_batch(depth=4, repeat=20):
+    if np is None:
+        print("NumPy is not installed")
+        return
+    for i, (board, color) in enumerate(midgame_positions()):
+        children = [child for child, action in board.all_possible_states(color)]
+        print("midgame position {}, {} children, {} to move".format(i, len(children), color.name))
+        start = time.process_time()
+        for r in range(repeat):
+            [Minimax_Node(child, color).evaluate() for child in children]
+        print("{:<12}{:>9.1f}us".format("one by one", (time.process_time() - start) / repeat * 1e6))
+        start = time.process_time()
+        for r in range(repeat):
+            batch_features(board_array(children), color)
+        print("{:<12}{:>9.1f}us".format("batch", (time.process_time() - start) / repeat * 1e6))
+        for name, batch in (("search", False), ("batch search", True)):
+            engine = Negamax(tt=TranspositionTable(), inplace=True, pvs=True, batch=batch)
+            start = time.process_time()
+            action = engine.iterative_deepening(Scalar_Node(board.copy(), color), depth)
+            report(name, action, engine.nodes, time.process_time() - start)
+
+
+# turns of a game from the second midgame position between a player
+# searching to depth, pondering or not, and one that does not ponder: the
+# CPU seconds of every turn of the first, whether the opponent played the
+# reply it pondered, and the CPU seconds pondered on the hits
+def bench_ponder(turns=10, depth=4):
+    board, color = list(midgame_positions())[1]
+    for ponder in (False, True):
+        cls = type("Bench_Player", (Player,), {"ponder": ponder, "search_depth": depth,
+                                               "time_budget": float("inf"), "book_path": None})
+        opponent_cls = type("Bench_Opponent", (cls,), {"ponder": False})
+        player, opponent = cls(color.name), opponent_cls(opposite(color).name)
+        player.board, opponent.board = board.copy(), board.copy()
+        print("pondering" if ponder else "not pondering")
+        print("{:<6}{:>10}{:>6}{:>10}".format("turn", "time", "hit", "saved"))
+        total = 0
+        for turn in range(turns):
+            hit = player.ponderer is not None and player.ponderer.pending is not None
+            saved = sum(player.ponderer.saved) if player.ponderer else 0
+            used = player.clock.used
+            action = player.action()
+            total += player.clock.used - used
+            print("{:<6}{:>9.3f}s{:>6}{:>9.3f}s  {}".format(
+                turn, player.clock.used - used, "yes" if hit else "",
+                (sum(player.ponderer.saved) if player.ponderer else 0) - saved, action))
+            for colour, move in ((color.name, action), (opposite(color).name, None)):
+                if move is None:
+                    if not player.board.count_tokens(Color.white) or not player.board.count_tokens(Color.black):
+                        break
+                    move = opponent.action()
+                player.update(colour, move)
+                opponent.update(colour, move)
+            if not player.board.count_tokens(Color.white) or not player.board.count_tokens(Color.black):
+                break
+        if player.ponderer:
+            print("{} hits, {} misses".format(player.ponderer.hits, player.ponderer.misses))
+        print("{:<6}{:>9.3f}s".format("total", total))
+        player.stop_pondering()
+
+
+BENCHMARKS = {
+    "board": bench_board,
+    "inplace": bench_inplace,
+    "tt": bench_tt,
+    "tables": bench_tables,
+    "squares": bench_squares,
+    "components": bench_components,
+    "dedup": bench_dedup,
+    "negamax": bench_negamax,
+    "ordering": bench_ordering,
+    "quiescence": bench_quiescence,
+    "pvs": bench_pvs,
+    "parallel": bench_parallel,
+    "smp": bench_smp,
+    "evalcache": bench_evalcache,
+    "batch": bench_batch,
+    "ponder": bench_ponder,
+}
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "board"
+    BENCHMARKS[name](*(int(arg) for arg in sys.argv[2:]))
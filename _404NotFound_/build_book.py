@@ -0,0 +1,72 @@
+"""
+Build the opening book from searches of the positions the player meets in
+self-play games from the opening position.
+Run with: python -m _404NotFound_.build_book [games] [plies] [depth]
+"""
+
+import random
+import sys
+import time
+
+from _404NotFound_.algorithm.book import write_book
+from _404NotFound_.env.board import *
+from _404NotFound_.player import Player, BOOK_PATH, book_key, unpack_score
+
+
+class BookPlayer(Player):
+    # no time limit, every search goes to search_depth, and no book
+    time_budget = float("inf")
+    book_path = None
+
+    # the player searches one ply while no stack is next to an enemy, but
+    # the book is meant for exactly those positions
+    def explore_stage(self):
+        return False
+
+
+# return the book moves {(<key>, <action>): (<visits>, <score>)} of games
+# self-play games of plies plies, every position searched by the player
+# with search_depth depth; with probability variety a side plays a random
+# action instead, so the games spread out, and the action is not booked;
+# positions are keyed by canonical key with the actions on the canonical form
+def build_book(games=20, plies=12, depth=4, variety=0.2, seed=404):
+    BookPlayer.search_depth = depth
+    rng = random.Random(seed)
+    # {<key>: (<action>, <score>)} of the positions searched
+    searched = {}
+    moves = {}
+    for game in range(games):
+        board = Board(True)
+        color = Color.white
+        for ply in range(plies):
+            if not board.count_tokens(Color.white) or not board.count_tokens(Color.black):
+                break
+            key = book_key(board, color)
+            if key not in searched:
+                player = BookPlayer(color.name)
+                player.board = board.copy()
+                player.clock.turns = ply // 2
+                action = player.action()
+                # the action on the canonical form of the board, and ft, the
+                # token ratio, for the side to move
+                searched[key] = (mirror_action(action) if board.mirrored else action,
+                                 unpack_score(player.engine.score)[0])
+            booked, score = searched[key]
+            if rng.random() < variety:
+                action = rng.choice(list(board.all_possible_actions(color)))
+            else:
+                action = mirror_action(booked) if board.mirrored else booked
+                visits = moves.get((key, booked), (0, score))[0]
+                moves[(key, booked)] = (visits + 1, score)
+            board = board.apply_action(action)
+            color = opposite(color)
+    return moves
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    start = time.process_time()
+    moves = build_book(*args)
+    write_book(BOOK_PATH, moves)
+    print("{} book moves of {} positions written to {} in {:.1f}s".format(
+        len(moves), len({key for key, action in moves}), BOOK_PATH, time.process_time() - start))
@@ -0,0 +1,25 @@
+"""
+Build the endgame tablebase of every position with at most
+max_total_tokens tokens on the board, both sides together. 3 (1 against
+1, 2 against 1) take seconds; 4 add 3 against 1 and 2 against 2, about
+15 million positions, and take several minutes.
+Run with: python -m _404NotFound_.build_tablebase [max_total_tokens]
+"""
+
+import os
+import sys
+import time
+
+from _404NotFound_.algorithm.tablebase import build_tablebase
+from _404NotFound_.player import TABLEBASE_PATH
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    start = time.process_time()
+    solver = build_tablebase(TABLEBASE_PATH, *args)
+    for (w, b), values in solver.values.items():
+        print("{} against {}: {} positions, {} won, {} lost".format(
+            w, b, len(values), sum(1 for v in values if v > 0), sum(1 for v in values if v < 0)))
+    print("{} bytes written to {} in {:.1f}s".format(
+        os.path.getsize(TABLEBASE_PATH), TABLEBASE_PATH, time.process_time() - start))
@@ -0,0 +1,96 @@
+"""
+Batch evaluation features of many boards at once.
+The boards are the rows of an (N, 64) int8 array of cells, in Board.cells
+order, and every feature is computed with NumPy array operations over the
+whole batch. NumPy is optional: without it np is None and callers evaluate
+board by board.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from _404NotFound_.env.board import *
+
+# columns of batch_features, the terms of the Player's evaluation
+FEATURES = ("ft", "f0", "f2", "f3")
+
+if np is not None:
+    # REACH[i, num, j]: a stack of num tokens on square i can move to j
+    REACH = np.zeros((BOARD_LEN ** 2, MAX_DISTANCE + 1, BOARD_LEN ** 2), dtype=bool)
+    for _i in range(BOARD_LEN ** 2):
+        for _num in range(MAX_DISTANCE + 1):
+            REACH[_i, _num, CARD_NEIGHBOURS[_i][_num]] = True
+    # |i - j| between every two lines
+    LINE_DISTANCE = np.abs(np.arange(BOARD_LEN)[:, None] - np.arange(BOARD_LEN)[None, :])
+
+
+def board_array(boards):
+    return np.array([board.cells for board in boards], dtype=np.int8)
+
+
+# return (<white tokens>, <black tokens>) of the component of every square,
+# (N, 64) arrays holding the totals at the lowest square of each component
+# and 0 elsewhere
+def component_totals(cells):
+    n = len(cells)
+    occupied = cells.reshape(n, BOARD_LEN, BOARD_LEN) != 0
+    empty = BOARD_LEN ** 2
+    labels = np.where(occupied, np.arange(empty, dtype=np.int8).reshape(BOARD_LEN, BOARD_LEN),
+                      np.int8(empty))
+    # spread the lowest square of every component through it, one king
+    # step per round: the 3 x 3 minimum is the 3 wide minimum of the rows
+    # taken over 3 rows
+    padded = np.full((n, BOARD_LEN + 2, BOARD_LEN + 2), empty, dtype=np.int8)
+    while True:
+        padded[:, 1:-1, 1:-1] = labels
+        rows = np.minimum(np.minimum(padded[:, :, :-2], padded[:, :, 1:-1]), padded[:, :, 2:])
+        spread = np.minimum(np.minimum(rows[:, :-2], rows[:, 1:-1]), rows[:, 2:])
+        spread = np.where(occupied, spread, np.int8(empty))
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    index = (labels.reshape(n, -1) + np.arange(n)[:, None] * (empty + 1)).ravel()
+    totals = []
+    for tokens in (np.maximum(cells, 0), np.maximum(-cells, 0)):
+        totals.append(np.bincount(index, tokens.ravel(), n * (empty + 1)).reshape(n, empty + 1)[:, :empty])
+    return totals[0].astype(np.int64), totals[1].astype(np.int64)
+
+
+# a / b, a / 0.01 where b is 0
+def _ratio(a, b):
+    return np.where(b == 0, a / 0.01, a / np.where(b == 0, 1, b))
+
+
+# return the (N, 4) FEATURES matrix of the boards in cells for the player
+# of color, the same values Minimax_Node.evaluate computes one by one
+def batch_features(cells, color):
+    cells = np.asarray(cells, dtype=np.int8).reshape(-1, BOARD_LEN ** 2).astype(np.int64)
+    own = cells * color.value
+    self_tokens = np.maximum(own, 0)
+    other_tokens = np.maximum(-own, 0)
+    self_num = self_tokens.sum(1)
+    other_num = other_tokens.sum(1)
+
+    # components holding both colors boom in our favour (reward) or not
+    white, black = component_totals(cells)
+    self_total, other_total = (white, black) if color == Color.white else (black, white)
+    mixed = (self_total > 0) & (other_total > 0)
+    delta = other_total - self_total
+    boom_reward = np.where(mixed & (delta > 0), delta, 0).sum(1)
+    boom_penalty = np.where(mixed & (delta <= 0), -delta, 0).sum(1)
+
+    ft = _ratio(self_num, other_num)
+    f0 = _ratio(self_num - boom_penalty, other_num - boom_reward)
+
+    # squares our stacks can move to that are not ours
+    reach = REACH[np.arange(BOARD_LEN ** 2), np.minimum(self_tokens, MAX_DISTANCE)]
+    explore = (reach & (self_tokens > 0)[:, :, None]).any(1) & (own <= 0)
+    f2 = explore.sum(1) - (self_tokens > 0).sum(1)
+
+    # Manhattan distance of every token pair, by columns and rows
+    self_grid = self_tokens.reshape(-1, BOARD_LEN, BOARD_LEN)
+    other_grid = other_tokens.reshape(-1, BOARD_LEN, BOARD_LEN)
+    f3 = -(np.einsum("ni,ij,nj->n", self_grid.sum(1), LINE_DISTANCE, other_grid.sum(1))
+           + np.einsum("ni,ij,nj->n", self_grid.sum(2), LINE_DISTANCE, other_grid.sum(2)))
+    return np.stack([ft, f0, f2, f3], axis=1)
@@ -0,0 +1,329 @@
+"""
+The bitboard module is an alternative Board engine.
+The position is kept as two 64-bit occupancy masks (one per color) plus a
+compact array of stack heights, so occupancy tests, neighbour checks and
+flood fills become integer mask operations.
+"""
+
+from functools import reduce
+
+from _404NotFound_.env.board import *
+
+# bit layout:
+# square (x, y) is stored at bit x * BOARD_LEN + y (column major), so that
+# iterating set bits from low to high visits the squares in the same order
+# as the x-then-y loops of Board
+FULL_MASK = (1 << BOARD_LEN ** 2) - 1
+# every square except the bottom / top row
+NOT_Y0 = reduce(lambda m, x: m & ~(1 << x * BOARD_LEN), range(BOARD_LEN), FULL_MASK)
+NOT_Y7 = reduce(lambda m, x: m & ~(1 << x * BOARD_LEN + BOARD_LEN - 1), range(BOARD_LEN), FULL_MASK)
+
+
+def bit_index(x, y):
+    return x * BOARD_LEN + y
+
+
+def bit_pos(i):
+    return SQUARE_POS[i % BOARD_LEN * BOARD_LEN + i // BOARD_LEN]
+
+
+def dilate(mask):
+    """ grow a mask by one king step in every direction """
+    mask |= ((mask << 1) & NOT_Y0) | ((mask >> 1) & NOT_Y7)
+    return (mask | (mask << BOARD_LEN) | (mask >> BOARD_LEN)) & FULL_MASK
+
+
+def bits(mask):
+    """ yield the index of every set bit, lowest first """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# 8-neighbour mask of every square
+NEIGHBOUR_MASK = [dilate(1 << i) & ~(1 << i) for i in range(BOARD_LEN ** 2)]
+
+# bit of every Board cell index, and the other way round
+CELL_BIT = [bit_index(i % BOARD_LEN, i // BOARD_LEN) for i in range(BOARD_LEN ** 2)]
+BIT_CELL = [i % BOARD_LEN * BOARD_LEN + i // BOARD_LEN for i in range(BOARD_LEN ** 2)]
+
+# Zobrist keys in bit order, so a BitBoard has the same key as the Board
+# of the same position
+BIT_ZOBRIST = [ZOBRIST[BIT_CELL[i]] for i in range(BOARD_LEN ** 2)]
+BIT_MIRROR_ZOBRIST = [MIRROR_ZOBRIST[BIT_CELL[i]] for i in range(BOARD_LEN ** 2)]
+
+
+class BitBoard(Board):
+    """ constructors """
+    # board representation:
+    # white, black: <int> occupancy masks
+    # heights: bytearray(64) stack number of each square, in bit order
+    # key, mirror_key: <int> Zobrist keys, equal to those of the matching Board
+    def __init__(self, reset=False):
+        self.white = 0
+        self.black = 0
+        self.heights = bytearray(BOARD_LEN ** 2)
+        self.key = 0
+        self.mirror_key = 0
+        if reset:
+            board = Board(True)
+            self.set_cells(board.cells)
+
+    def copy(self):
+        new = BitBoard.__new__(BitBoard)
+        new.white = self.white
+        new.black = self.black
+        new.heights = self.heights[:]
+        new.key = self.key
+        new.mirror_key = self.mirror_key
+        return new
+
+    def __getstate__(self):
+        return self.white, self.black, bytes(self.heights), self.key, self.mirror_key
+
+    def __setstate__(self, state):
+        self.white, self.black, heights, self.key, self.mirror_key = state
+        self.heights = bytearray(heights)
+
+    @classmethod
+    def from_board(cls, board):
+        new = cls()
+        new.set_cells(board.cells)
+        return new
+
+    # cells view for compatibility with code written against Board
+    @property
+    def cells(self):
+        cells = [0] * BOARD_LEN ** 2
+        for i in bits(self.white):
+            cells[i % BOARD_LEN * BOARD_LEN + i // BOARD_LEN] = self.heights[i]
+        for i in bits(self.black):
+            cells[i % BOARD_LEN * BOARD_LEN + i // BOARD_LEN] = -self.heights[i]
+        return cells
+
+    def set_cells(self, cells):
+        self.white = 0
+        self.black = 0
+        self.heights = bytearray(BOARD_LEN ** 2)
+        for x in range(BOARD_LEN):
+            for y in range(BOARD_LEN):
+                value = cells[y * BOARD_LEN + x]
+                i = bit_index(x, y)
+                if value > 0:
+                    self.white |= 1 << i
+                elif value < 0:
+                    self.black |= 1 << i
+                self.heights[i] = abs(value)
+        self.key = zobrist_key(cells)
+        self.mirror_key = mirror_key(cells)
+
+    def mirror(self):
+        cells = self.cells
+        new = BitBoard()
+        new.set_cells([cells[MIRROR[i]] for i in range(BOARD_LEN ** 2)])
+        return new
+
+    def mask(self, color):
+        if color == Color.white:
+            return self.white
+        elif color == Color.black:
+            return self.black
+        return FULL_MASK & ~(self.white | self.black)
+
+    """ query single cell functions """
+    def is_blank(self, x, y):
+        return not ((self.white | self.black) >> bit_index(x, y)) & 1
+
+    def is_white(self, x, y):
+        return bool((self.white >> bit_index(x, y)) & 1)
+
+    def is_black(self, x, y):
+        return bool((self.black >> bit_index(x, y)) & 1)
+
+    def is_color(self, x, y, color):
+        return bool((self.mask(color) >> bit_index(x, y)) & 1)
+
+    def get_color(self, x, y):
+        i = bit_index(x, y)
+        if (self.white >> i) & 1:
+            return Color.white
+        elif (self.black >> i) & 1:
+            return Color.black
+        else:
+            return Color.none
+
+    # stack number
+    def get_num(self, x, y):
+        return self.heights[bit_index(x, y)]
+
+    """ query multiple cells functions """
+    def get_white(self):
+        return [(bit_pos(i), self.heights[i]) for i in bits(self.white)]
+
+    def get_black(self):
+        return [(bit_pos(i), self.heights[i]) for i in bits(self.black)]
+
+    def get_pieces(self, color):
+        return [(bit_pos(i), self.heights[i]) for i in bits(self.mask(color))]
+
+    def get_stacks(self, color):
+        mask = self.mask(color)
+        return [BIT_CELL[i] for i in bits(mask)], [self.heights[i] for i in bits(mask)]
+
+    # number of stacks / tokens of the given color
+    def count_stacks(self, color):
+        return self.mask(color).bit_count()
+
+    def count_tokens(self, color):
+        return sum(self.heights[i] for i in bits(self.mask(color)))
+
+    def token_distance(self):
+        lines = [0] * 4 * BOARD_LEN
+        for side, mask in ((0, self.white), (1, self.black)):
+            for i in bits(mask):
+                lines[side * 16 + i // BOARD_LEN] += self.heights[i]
+                lines[side * 16 + 8 + i % BOARD_LEN] += self.heights[i]
+        return line_distance(lines[0:8], lines[16:24]) + line_distance(lines[8:16], lines[24:32])
+
+    # mask of the connected occupied squares containing bit i
+    def component_mask(self, i):
+        occupied = self.white | self.black
+        component = 1 << i
+        while True:
+            grown = dilate(component) & occupied
+            if grown == component:
+                return component
+            component = grown
+
+    def get_boom(self, x, y):
+        return [(bit_pos(i), self.heights[i]) for i in bits(self.component_mask(bit_index(x, y)))]
+
+    def get_boom_component(self):
+        boom_component = {Color.white:[], Color.black:[]}
+        remaining = self.white | self.black
+        while remaining:
+            component = self.component_mask((remaining & -remaining).bit_length() - 1)
+            remaining &= ~component
+            white_part = component & self.white
+            black_part = component & self.black
+            if white_part and black_part:
+                boom_component[Color.white].append(sum(self.heights[i] for i in bits(white_part)))
+                boom_component[Color.black].append(sum(self.heights[i] for i in bits(black_part)))
+        return boom_component
+
+    def component_totals(self, index):
+        component = self.component_mask(CELL_BIT[index])
+        return (sum(self.heights[i] for i in bits(component & self.white)),
+                sum(self.heights[i] for i in bits(component & self.black)))
+
+    def boom_aliases(self, action, color):
+        component = self.component_mask(bit_index(*action[1]))
+        return [("BOOM", COORDS[BIT_CELL[i]]) for i in bits(self.mask(color) & component)
+                if NEIGHBOUR_MASK[i] & self.mask(opposite(color))]
+
+    """ action funcitons """
+    # apply the action in place
+    # return an undo token:
+    # (<white>, <black>, <key>, <mirror key>, ((<bit>, <old height>), ...))
+    def make(self, action):
+        heights = self.heights
+        if action[0] == "MOVE":
+            _n = action[1]
+            _from = bit_index(*action[2])
+            _to = bit_index(*action[3])
+            undo = (self.white, self.black, self.key, self.mirror_key,
+                    ((_from, heights[_from]), (_to, heights[_to])))
+            if (self.white >> _from) & 1:
+                self.white |= 1 << _to
+                _sign = 1
+            else:
+                self.black |= 1 << _to
+                _sign = -1
+            self.key ^= (BIT_ZOBRIST[_from][_sign * heights[_from] + MAX_STACK]
+                         ^ BIT_ZOBRIST[_to][_sign * heights[_to] + MAX_STACK])
+            self.mirror_key ^= (BIT_MIRROR_ZOBRIST[_from][_sign * heights[_from] + MAX_STACK]
+                                ^ BIT_MIRROR_ZOBRIST[_to][_sign * heights[_to] + MAX_STACK])
+            heights[_from] -= _n
+            heights[_to] += _n
+            self.key ^= (BIT_ZOBRIST[_from][_sign * heights[_from] + MAX_STACK]
+                         ^ BIT_ZOBRIST[_to][_sign * heights[_to] + MAX_STACK])
+            self.mirror_key ^= (BIT_MIRROR_ZOBRIST[_from][_sign * heights[_from] + MAX_STACK]
+                                ^ BIT_MIRROR_ZOBRIST[_to][_sign * heights[_to] + MAX_STACK])
+            if not heights[_from]:
+                self.white &= ~(1 << _from)
+                self.black &= ~(1 << _from)
+        elif action[0] == "BOOM":
+            component = self.component_mask(bit_index(*action[1]))
+            undo = (self.white, self.black, self.key, self.mirror_key,
+                    tuple((i, heights[i]) for i in bits(component)))
+            for i in bits(component & self.white):
+                self.key ^= BIT_ZOBRIST[i][heights[i] + MAX_STACK]
+                self.mirror_key ^= BIT_MIRROR_ZOBRIST[i][heights[i] + MAX_STACK]
+                heights[i] = 0
+            for i in bits(component & self.black):
+                self.key ^= BIT_ZOBRIST[i][MAX_STACK - heights[i]]
+                self.mirror_key ^= BIT_MIRROR_ZOBRIST[i][MAX_STACK - heights[i]]
+                heights[i] = 0
+            self.white &= ~component
+            self.black &= ~component
+        return undo
+
+    def unmake(self, undo):
+        self.white, self.black, self.key, self.mirror_key, changed = undo
+        heights = self.heights
+        for i, height in changed:
+            heights[i] = height
+
+    # return a iterable of <action>, booms first
+    def boom_actions(self, color):
+        own = self.mask(color)
+        other = self.mask(opposite(color))
+        boomed = 0
+        for i in bits(own):
+            # ignore entirely friendly fire
+            if NEIGHBOUR_MASK[i] & other:
+                if (boomed >> i) & 1:
+                    Board.duplicates_skipped += 1
+                    continue
+                if self.unique_booms:
+                    boomed |= self.component_mask(i)
+                yield ("BOOM", COORDS[BIT_CELL[i]])
+
+    def all_possible_actions(self, color):
+        own = self.mask(color)
+        other = self.mask(opposite(color))
+        heights = self.heights
+
+        yield from self.boom_actions(color)
+
+        move_list = []
+        for i in bits(own):
+            num = heights[i]
+            square = BIT_CELL[i]
+            for j in CARD_NEIGHBOURS[square][num]:
+                # ignore moving onto opposite color pieces
+                if (other >> CELL_BIT[j]) & 1:
+                    continue
+                for _n in range(1, num+1):
+                    move_list.append(("MOVE", _n, COORDS[square], COORDS[j]))
+
+        # enemy neighbour count, computed only for the squares we look at
+        threat_map = {}
+        def threat_of(square):
+            if square not in threat_map:
+                threat_map[square] = (NEIGHBOUR_MASK[bit_index(*square)] & other).bit_count()
+            return threat_map[square]
+
+        def _sort_func(action):
+            _n = action[1]
+            _from = threat_of(action[2])
+            _to = threat_of(action[3])
+            threat = _from - _to
+            threat = threat if threat > 0 else 0
+            reward = _to - heights[bit_index(*action[3])] - _n
+            reward = reward if reward > 0 else 0
+            return - (reward if reward > threat else threat)
+
+        move_list.sort(key = _sort_func)
+        yield from move_list
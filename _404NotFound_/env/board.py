@@ -4,6 +4,7 @@ It has 5 classes: Chess, Pos, Cell, Board, BoardNode
 """
 
 import json
+import random
 from enum import Enum
 from functools import reduce
 
@@ -22,14 +23,99 @@ def opposite(color):
         return Color.black
     return Color.none
 
+# index of a color in the per side features of Board
+SIDE = {Color.white: 0, Color.black: 1}
+
+# most tokens a side can stack on one square
+MAX_STACK = 12
+
+# Zobrist keys:
+# ZOBRIST[<cell index>][<cell value> + MAX_STACK] is a random 64-bit int
+# (0 for an empty cell), the key of a board is the xor over all its cells.
+# The generator is seeded so keys stay the same between runs.
+_zobrist_random = random.Random(404)
+ZOBRIST = [[_zobrist_random.getrandbits(64) if value else 0
+            for value in range(-MAX_STACK, MAX_STACK + 1)]
+           for i in range(BOARD_LEN ** 2)]
+
+def zobrist_key(cells):
+    return reduce(lambda key, i: key ^ ZOBRIST[i][cells[i] + MAX_STACK], range(BOARD_LEN ** 2), 0)
+
+# the Zobrist keys of the mirrored squares: the mirror key of a board, the
+# xor over all its cells, is the key of its mirror image
+MIRROR_ZOBRIST = [ZOBRIST[MIRROR[i]] for i in range(BOARD_LEN ** 2)]
+
+def mirror_key(cells):
+    return reduce(lambda key, i: key ^ MIRROR_ZOBRIST[i][cells[i] + MAX_STACK], range(BOARD_LEN ** 2), 0)
+
+# the key of a board or of its mirror image, whichever is lower: the same
+# for both, so tables keyed by it hold a position and its mirror image once
+def canonical_key(cells):
+    return min(zobrist_key(cells), mirror_key(cells))
+
+# the action reflected left to right, the same action on the mirror image
+def mirror_action(action):
+    if action[0] == "MOVE":
+        return ("MOVE", action[1], (BOARD_LEN - 1 - action[2][0], action[2][1]),
+                (BOARD_LEN - 1 - action[3][0], action[3][1]))
+    return ("BOOM", (BOARD_LEN - 1 - action[1][0], action[1][1]))
+
+# sum of a[i] * b[j] * |i - j| over every two lines i, j, where a and b
+# are token counts per line
+def line_distance(a, b):
+    total = 0
+    a_count = a_sum = b_count = b_sum = 0
+    for i in range(BOARD_LEN):
+        # pairs with the other token on an earlier line
+        total += a[i] * (i * b_count - b_sum) + b[i] * (i * a_count - a_sum)
+        a_count += a[i]
+        a_sum += i * a[i]
+        b_count += b[i]
+        b_sum += i * b[i]
+    return total
+
+# re-key a state value table by canonical key, tables saved with
+# tuple(board.cells) keys are converted, int keys are kept; a position and
+# its mirror image both in the table take the mean of their values
+def rekey_state_values(state_values):
+    rekeyed = {}
+    for key, value in state_values.items():
+        key = key if isinstance(key, int) else canonical_key(key)
+        if key in rekeyed:
+            value = (rekeyed[key] + value) / 2
+        rekeyed[key] = value
+    return rekeyed
+
 class Board:
+    # all stacks of one component produce the same board when they boom, so
+    # only the first boom of each component is generated (see boom_aliases);
+    # duplicates_skipped counts the booms left out, in every board; the
+    # engine reports those of a search in its stats
+    unique_booms = True
+    duplicates_skipped = 0
+
     """ constructors """
     # board representation:
     # [<int>*64]
     # =0 for no pieces
     # >0 for white pieces
     # <0 for black pieces
+    # key: <int> Zobrist key of the cells, kept up to date by make / unmake
+    # mirror_key: <int> key of the mirror image, kept the same way
+    # label: [<int>*64] id of the 8-connected component of each occupied
+    #   cell, -1 for an empty cell; the id is one of the component's cells
+    # components: {<id>: (<white tokens>, <black tokens>)}
+    # make never mutates label / components in place, it replaces them, so
+    # copies can share them and unmake only has to put the old ones back
+    # features, updated by make / unmake for every changed cell:
+    # counts: [<white tokens>, <black tokens>, <white stacks>, <black stacks>]
+    # lines: [<int>*32] tokens of white per column x at x, per row y at
+    #   8 + y, and those of black at 16 + x / 24 + y
+    # adjacent: [<int>*128] occupied neighbour squares of every square,
+    #   white ones at the square index, black ones at 64 + index
     def __init__(self, reset=False):
+        self.key = 0
+        self.mirror_key = 0
         if reset: 
             # with open("_404NotFound_/env/init_state.json") as file:
                 self.cells = [0 for i in range(BOARD_LEN ** 2)]
@@ -42,12 +128,123 @@ class Board:
                     self.cells[stack[2] * BOARD_LEN + stack[1]] = stack[0]                    
                 for stack in data["black"]:
                     self.cells[stack[2] * BOARD_LEN + stack[1]] = -stack[0]
+                self.key = zobrist_key(self.cells)
+                self.mirror_key = mirror_key(self.cells)
+                self.build_components()
+                self.build_features()
 
     def copy(self):
         new = Board()
         new.cells = self.cells.copy()
+        new.key = self.key
+        new.mirror_key = self.mirror_key
+        new.label = self.label
+        new.components = self.components
+        new.counts = self.counts.copy()
+        new.lines = self.lines.copy()
+        new.adjacent = self.adjacent.copy()
         return new
 
+    # pickled as the 64 cells in signed bytes, the key and components are
+    # rebuilt on load
+    def __getstate__(self):
+        return bytes(c & 0xff for c in self.cells)
+
+    def __setstate__(self, state):
+        self.cells = [c - 256 if c > 127 else c for c in state]
+        self.key = zobrist_key(self.cells)
+        self.mirror_key = mirror_key(self.cells)
+        self.build_components()
+        self.build_features()
+
+    # the key shared by the board and its mirror image
+    @property
+    def canonical_key(self):
+        return min(self.key, self.mirror_key)
+
+    # the mirror image is the canonical form: actions kept against
+    # canonical_key are mirrored
+    @property
+    def mirrored(self):
+        return self.mirror_key < self.key
+
+    # return the board reflected left to right
+    def mirror(self):
+        new = Board()
+        new.__setstate__(bytes(self.cells[MIRROR[i]] & 0xff for i in range(BOARD_LEN ** 2)))
+        return new
+
+    # return the canonical form of the board, the board or its mirror image
+    def canonical(self):
+        return self.mirror() if self.mirrored else self.copy()
+
+    # label every component of the cells from scratch
+    def build_components(self):
+        self.label = [-1] * BOARD_LEN ** 2
+        self.components = {}
+        seen = [False] * BOARD_LEN ** 2
+        for i in range(BOARD_LEN ** 2):
+            if self.cells[i] and not seen[i]:
+                self._flood_component(i, self.label, self.components, seen)
+
+    # label the component of start with id start and record its totals
+    def _flood_component(self, start, label, components, seen):
+        cells = self.cells
+        white = 0
+        black = 0
+        queue = [start]
+        seen[start] = True
+        while queue:
+            i = queue.pop()
+            label[i] = start
+            if cells[i] > 0:
+                white += cells[i]
+            else:
+                black -= cells[i]
+            for j in NEIGHBOURS[i]:
+                if cells[j] and not seen[j]:
+                    seen[j] = True
+                    queue.append(j)
+        components[start] = (white, black)
+
+    # compute the features of the cells from scratch
+    def build_features(self):
+        self.counts = [0] * 4
+        self.lines = [0] * 4 * BOARD_LEN
+        self.adjacent = [0] * 2 * BOARD_LEN ** 2
+        for i in range(BOARD_LEN ** 2):
+            if self.cells[i]:
+                self._update_features(i, 0, self.cells[i])
+
+    # update the features for cell index changing from value old to new
+    def _update_features(self, index, old, new):
+        counts = self.counts
+        lines = self.lines
+        x = index % BOARD_LEN
+        y = index // BOARD_LEN
+        if old:
+            side = 0 if old > 0 else 1
+            num = old if old > 0 else -old
+            counts[side] -= num
+            counts[2 + side] -= 1
+            lines[side * 16 + x] -= num
+            lines[side * 16 + 8 + y] -= num
+            if old * new <= 0:
+                adjacent = self.adjacent
+                for j in NEIGHBOURS[index]:
+                    adjacent[side * 64 + j] -= 1
+        if new:
+            side = 0 if new > 0 else 1
+            num = new if new > 0 else -new
+            counts[side] += num
+            counts[2 + side] += 1
+            lines[side * 16 + x] += num
+            lines[side * 16 + 8 + y] += num
+            if old * new <= 0:
+                adjacent = self.adjacent
+                for j in NEIGHBOURS[index]:
+                    adjacent[side * 64 + j] += 1
+
     """ query single cell functions """
     def is_blank(self, x, y):
         return self.cells[y * BOARD_LEN +x] == 0
@@ -91,51 +288,65 @@ class Board:
     def get_pieces(self, color):
         return [(Pos(x, y), self.get_num(x, y)) for x in range(BOARD_LEN) for y in range(BOARD_LEN) if self.is_color(x, y, color)]
 
+    """ integer square functions
+        squares are indexed by y * BOARD_LEN + x, see the tables in pos.py
+    """
+
+    # stacks with given color as parallel lists, in get_pieces order
+    # return ([<int> - square], [<int> - stack number])
+    def get_stacks(self, color):
+        cells = self.cells
+        sign = color.value
+        squares = [i for i in SQUARE_ORDER if cells[i] * sign > 0]
+        return squares, [abs(cells[i]) for i in squares]
+
+    # number of stacks / tokens with given color
+    def count_stacks(self, color):
+        return self.counts[2 + SIDE[color]]
+
+    def count_tokens(self, color):
+        return self.counts[SIDE[color]]
+
+    # sum of the Manhattan distances of every white and black token pair
+    def token_distance(self):
+        lines = self.lines
+        return line_distance(lines[0:8], lines[16:24]) + line_distance(lines[8:16], lines[24:32])
+
     # Get the Pos of all pieces that will be influenced by the boom action
     # return [<pieces>]
     def get_boom(self, x, y):
+        return [(SQUARE_POS[i], abs(self.cells[i])) for i in self.boom_indices(y * BOARD_LEN + x)]
+
+    # indices of all cells that will be influenced by the boom at index
+    def boom_indices(self, index):
+        cells = self.cells
         boom = []
-        queue = [Pos(x, y)]
-        mark = [False for i in range(BOARD_LEN ** 2)]
-        mark[y*BOARD_LEN +x] = True
+        queue = [index]
+        mark = [False] * BOARD_LEN ** 2
+        mark[index] = True
         while queue:
-            pos = queue.pop()
-            boom.append((pos, self.get_num(pos.x, pos.y)))
-            for neighbour in pos.neighbour():
-                if not mark[neighbour.y*BOARD_LEN+neighbour.x]:
-                    mark[neighbour.y*BOARD_LEN+neighbour.x] = True
-                    if not self.is_blank(neighbour.x, neighbour.y):
-                        queue.append(neighbour)
+            i = queue.pop()
+            boom.append(i)
+            for j in NEIGHBOURS[i]:
+                if not mark[j]:
+                    mark[j] = True
+                    if cells[j]:
+                        queue.append(j)
         return boom
 
     # return {Color.white:[<pieces>], Color.black:[<pieces>]}
     def get_boom_component(self):
-        mark = [False for i in range(BOARD_LEN ** 2)]
         boom_component = {Color.white:[], Color.black:[]}
-        for x in range(BOARD_LEN):
-            for y in range(BOARD_LEN):
-                if not mark[y*BOARD_LEN+x] and not self.is_blank(x, y):
-                    queue = [Pos(x, y)]
-                    mark[y*BOARD_LEN+x] = True
-                    black = 0
-                    white = 0
-                    while queue:
-                        pos = queue.pop()
-                        if self.get_color(pos.x, pos.y) == Color.white:
-                            white += self.get_num(pos.x, pos.y)
-                        else:
-                            black += self.get_num(pos.x, pos.y)
-
-                        for neighbour in pos.neighbour():
-                            if not mark[neighbour.y*BOARD_LEN+neighbour.x]:
-                                mark[neighbour.y*BOARD_LEN+neighbour.x] = True
-                                if not self.is_blank(neighbour.x, neighbour.y):
-                                    queue.append(neighbour)
-                    if white > 0 and black > 0:
-                        boom_component[Color.white].append(white)
-                        boom_component[Color.black].append(black)
+        for white, black in self.components.values():
+            if white > 0 and black > 0:
+                boom_component[Color.white].append(white)
+                boom_component[Color.black].append(black)
         return boom_component
 
+    # (<white tokens>, <black tokens>) of the component of an occupied cell
+    def component_totals(self, index):
+        return self.components[self.label[index]]
+
 
     """ action funcitons
         action representation:
@@ -146,21 +357,109 @@ class Board:
     # !!! no validation in this fuction
     def apply_action(self, action):
         s = self.copy()
+        s.make(action)
+        return s
+
+    # apply the action in place
+    # return an undo token:
+    # (<old key>, <old mirror key>, ((<index>, <old cell value>), ...), <old label>, <old components>)
+    def make(self, action):
+        cells = self.cells
+        key = self.key
+        mirror = self.mirror_key
+        undo_label = self.label
+        undo_components = self.components
+        label = self.label[:]
+        components = self.components.copy()
         if action[0] == "MOVE":
             _n = action[1]
-            _from = Pos(action[2][0], action[2][1]) 
-            _to = Pos(action[3][0], action[3][1])
-            _sign = 1 if s.cells[_from.y * BOARD_LEN + _from.x] > 0 else -1
-            s.cells[_from.y * BOARD_LEN + _from.x] -= _sign * _n
-            s.cells[_to.y * BOARD_LEN + _to.x] += _sign * _n
+            _from = action[2][1] * BOARD_LEN + action[2][0]
+            _to = action[3][1] * BOARD_LEN + action[3][0]
+            changed = ((_from, cells[_from]), (_to, cells[_to]))
+            _sign = 1 if cells[_from] > 0 else -1
+            _delta = (_n, 0) if _sign > 0 else (0, _n)
+
+            # take the tokens off _from, a component can only split when
+            # the cell is emptied
+            cells[_from] -= _sign * _n
+            if cells[_from]:
+                white, black = components[label[_from]]
+                components[label[_from]] = (white - _delta[0], black - _delta[1])
+            else:
+                del components[label[_from]]
+                label[_from] = -1
+                seen = [False] * BOARD_LEN ** 2
+                for j in NEIGHBOURS[_from]:
+                    if cells[j] and not seen[j]:
+                        self._flood_component(j, label, components, seen)
+
+            # put them on _to, a newly occupied cell merges its neighbours
+            if cells[_to]:
+                white, black = components[label[_to]]
+                components[label[_to]] = (white + _delta[0], black + _delta[1])
+                cells[_to] += _sign * _n
+            else:
+                cells[_to] += _sign * _n
+                for j in NEIGHBOURS[_to]:
+                    if cells[j]:
+                        components.pop(label[j], None)
+                self._flood_component(_to, label, components, [False] * BOARD_LEN ** 2)
+
+            self.key ^= (ZOBRIST[_from][changed[0][1] + MAX_STACK] ^ ZOBRIST[_from][cells[_from] + MAX_STACK]
+                         ^ ZOBRIST[_to][changed[1][1] + MAX_STACK] ^ ZOBRIST[_to][cells[_to] + MAX_STACK])
+            self.mirror_key ^= (MIRROR_ZOBRIST[_from][changed[0][1] + MAX_STACK]
+                                ^ MIRROR_ZOBRIST[_from][cells[_from] + MAX_STACK]
+                                ^ MIRROR_ZOBRIST[_to][changed[1][1] + MAX_STACK]
+                                ^ MIRROR_ZOBRIST[_to][cells[_to] + MAX_STACK])
+            self._update_features(_from, changed[0][1], cells[_from])
+            self._update_features(_to, changed[1][1], cells[_to])
         elif action[0] == "BOOM":
-            for pos, num in s.get_boom(action[1][0], action[1][1]):
-                s.cells[pos.y * BOARD_LEN + pos.x] = 0
-        return s
+            # the boom chain is exactly one component
+            changed = []
+            start = action[1][1] * BOARD_LEN + action[1][0]
+            del components[label[start]]
+            for index in self.boom_indices(start):
+                changed.append((index, cells[index]))
+                self.key ^= ZOBRIST[index][cells[index] + MAX_STACK]
+                self.mirror_key ^= MIRROR_ZOBRIST[index][cells[index] + MAX_STACK]
+                self._update_features(index, cells[index], 0)
+                cells[index] = 0
+                label[index] = -1
+        self.label = label
+        self.components = components
+        return key, mirror, changed, undo_label, undo_components
+
+    # restore the cells changed by make
+    def unmake(self, undo):
+        cells = self.cells
+        self.key, self.mirror_key, changed, self.label, self.components = undo
+        for index, value in changed:
+            self._update_features(index, cells[index], value)
+            cells[index] = value
 
     # return a iterable of (<board>, <action>)
     def all_possible_states(self, color):
-        pieces = self.get_pieces(color)
+        for a in self.all_possible_actions(color):
+            yield (self.apply_action(a), a)
+
+    # return a iterable of <action>, booms first
+    # boom actions of color, one per component holding enemy tokens
+    def boom_actions(self, color):
+        enemy = 1 - SIDE[color]
+        adjacent = self.adjacent
+        boomed = set()
+        for i in self.get_stacks(color)[0]:
+            # ignore entirely friendly fire
+            if adjacent[enemy * 64 + i]:
+                if self.label[i] in boomed:
+                    Board.duplicates_skipped += 1
+                    continue
+                if self.unique_booms:
+                    boomed.add(self.label[i])
+                yield ("BOOM", COORDS[i])
+
+    def all_possible_actions(self, color):
+        squares, nums = self.get_stacks(color)
         # other_pieces = self.get_pieces(opposite(color))
 
         # other_pieces_num = sum(stack[1] for stack in other_pieces)
@@ -169,34 +468,25 @@ class Board:
         #consider the frontier pieces first
         # pieces.sort(key=lambda x: x[0].manh_dist(other_pieces_centroid))
 
-        # find possible boom actions
-        for pos, num in pieces:
-            # ignore entirely friendly fire
-            if [1 for _p in pos.neighbour() if self.is_color(_p.x, _p.y, opposite(color))]:
-                # generate next state
-                a = ("BOOM", (pos.x, pos.y))
-                s = self.apply_action(a)
-                yield (s, a)
+        cells = self.cells
+        sign = color.value
+
+        yield from self.boom_actions(color)
+        # distinct moves never lead to the same board: the changed cells and
+        # amounts of a move determine its from, to and n
         move_list = []
-        for pos, num in pieces:
+        for i, num in zip(squares, nums):
             # find possible move actions
-            for _p in pos.card_neighbour(num):
+            for j in CARD_NEIGHBOURS[i][num]:
                 # ignore moving onto opposite color pieces
-                if self.get_color(_p.x, _p.y) == opposite(color):
+                if cells[j] * sign < 0:
                     continue
-                # generate next state
                 for _n in range(1, num+1):
-                    a = ("MOVE", _n, (pos.x, pos.y), (_p.x, _p.y))
-                    move_list.append(a)
+                    move_list.append(("MOVE", _n, COORDS[i], COORDS[j]))
 
-        map = [0 for i in range(BOARD_LEN**2)]
-        for x in range(BOARD_LEN):
-             for y in range(BOARD_LEN):
-                count = 0
-                for neighbour in Pos(x, y).neighbour():
-                    if self.get_color(neighbour.x, neighbour.y) == opposite(color):
-                        count += 1
-                map[y*BOARD_LEN + x] = count
+        # number of opposite color neighbours of every square
+        enemy = 1 - SIDE[color]
+        map = self.adjacent[enemy * 64:enemy * 64 + BOARD_LEN ** 2]
 
         def _sort_func(action):
             _n = action[1]
@@ -205,15 +495,22 @@ class Board:
             threat = map[_from[0] + _from[1]*BOARD_LEN] - map[_to[0] + _to[1]*BOARD_LEN]
             threat = threat if threat > 0 else 0
             # print(threat)
-            reward = map[_to[0] + _to[1]*BOARD_LEN] - self.get_num(_to[0], _to[1]) - _n
+            reward = map[_to[0] + _to[1]*BOARD_LEN] - abs(cells[_to[0] + _to[1]*BOARD_LEN]) - _n
             reward = reward if reward > 0 else 0
             # print(reward)
             return  - (reward if reward > threat else threat)
 
         move_list.sort(key = _sort_func)
-        for a in move_list:
-            s = self.apply_action(a)
-            yield (s, a)
+        yield from move_list
+
+
+    # every boom all_possible_actions would generate for color without
+    # unique_booms that gives the same board as the given boom action
+    def boom_aliases(self, action, color):
+        start = action[1][1] * BOARD_LEN + action[1][0]
+        enemy = 1 - SIDE[color]
+        return [("BOOM", COORDS[i]) for i in self.get_stacks(color)[0]
+                if self.label[i] == self.label[start] and self.adjacent[enemy * 64 + i]]
 
 
     """ print functions """
@@ -59,3 +59,31 @@ class Pos:
 
     def __str__(self):
         return str((self.x, self.y))
+
+
+""" lookup tables
+    squares are indexed by y * BOARD_LEN + x, the same as Board.cells
+"""
+# the Pos of every square index
+SQUARE_POS = [Pos(i % BOARD_LEN, i // BOARD_LEN) for i in range(BOARD_LEN ** 2)]
+
+# the 8 neighbours of every square, in Pos.neighbour order
+NEIGHBOURS = [[_p.y * BOARD_LEN + _p.x for _p in pos.neighbour()] for pos in SQUARE_POS]
+
+# largest distance a stack can move: all tokens of one side stacked
+MAX_DISTANCE = 12
+
+# the squares in the four cardinal directions within distance d of every
+# square, in Pos.card_neighbour order: CARD_NEIGHBOURS[index][d]
+CARD_NEIGHBOURS = [[[_p.y * BOARD_LEN + _p.x for _p in pos.card_neighbour(d)]
+                    for d in range(MAX_DISTANCE + 1)] for pos in SQUARE_POS]
+
+# square indices in the x-then-y order the Board loops use
+SQUARE_ORDER = [y * BOARD_LEN + x for x in range(BOARD_LEN) for y in range(BOARD_LEN)]
+
+# the square of every square index reflected left to right, x -> 7 - x;
+# the rules and the start position are the same under the reflection
+MIRROR = [i // BOARD_LEN * BOARD_LEN + BOARD_LEN - 1 - i % BOARD_LEN for i in range(BOARD_LEN ** 2)]
+
+# the (x, y) tuple of every square index, used to build action tuples
+COORDS = [(i % BOARD_LEN, i // BOARD_LEN) for i in range(BOARD_LEN ** 2)]
@@ -0,0 +1,149 @@
+"""
+Perft: count the positions reached by every sequence of depth actions, to
+time move generation and check it against the referee's rules.
+The engine boards count with all_possible_actions and make / unmake, the
+referee with Game._available_actions and Game.update. The engine leaves
+out booms with no enemy next to them and all but one boom per component,
+so its counts are lower than the referee's; the divide lists every root
+action the two disagree on. A position where a side has no tokens left is
+a leaf. Board and BitBoard must agree exactly, and at every position of
+the engine's tree each of its actions must be legal for the referee and
+give the board Game.update gives.
+Run with: python -m _404NotFound_.perft [depth] [position]
+position: "opening" (default), or 0 to 3 for the benchmark midgame positions
+"""
+
+import sys
+import time
+from collections import Counter
+
+from _404NotFound_.benchmark import midgame_positions
+from _404NotFound_.env.board import *
+from _404NotFound_.env.bitboard import BitBoard
+from referee.game import Game
+
+
+def game_over(board):
+    return not board.count_tokens(Color.white) or not board.count_tokens(Color.black)
+
+
+# return the leaves depth actions below board with color to move, and add
+# every position reached to nodes[0]
+def perft(board, color, depth, nodes):
+    nodes[0] += 1
+    if not depth or game_over(board):
+        return 1
+    total = 0
+    for action in list(board.all_possible_actions(color)):
+        token = board.make(action)
+        total += perft(board, opposite(color), depth - 1, nodes)
+        board.unmake(token)
+    return total
+
+
+# return a referee Game in the position of board
+def referee_game(board):
+    game = Game()
+    cells = board.cells
+    for i in range(BOARD_LEN ** 2):
+        game._set(COORDS[i], cells[i])
+    game.score = {"white": board.count_tokens(Color.white), "black": board.count_tokens(Color.black)}
+    return game
+
+
+# perft by the referee's rules on game, left as it was
+def referee_perft(game, colour, depth, nodes):
+    nodes[0] += 1
+    if not depth or not game.score["white"] or not game.score["black"]:
+        return 1
+    total = 0
+    other = "black" if colour == "white" else "white"
+    for action in game._available_actions(colour):
+        saved = game.board.copy(), game.hash, dict(game.score), game.nturns, game.history.copy()
+        game.update(colour, action)
+        total += referee_perft(game, other, depth - 1, nodes)
+        game.board, game.hash, game.score, game.nturns, game.history = saved
+    return total
+
+
+# return {<root action>: <leaves>} of the engine board and of the referee
+def divide(board, color, depth):
+    engine = {}
+    for action in list(board.all_possible_actions(color)):
+        token = board.make(action)
+        engine[action] = perft(board, opposite(color), depth - 1, [0])
+        board.unmake(token)
+    game = referee_game(board)
+    referee = {}
+    for action in game._available_actions(color.name):
+        saved = game.board.copy(), game.hash, dict(game.score), game.nturns, game.history.copy()
+        game.update(color.name, action)
+        referee[action] = referee_perft(game, opposite(color).name, depth - 1, [0])
+        game.board, game.hash, game.score, game.nturns, game.history = saved
+    return engine, referee
+
+
+# return the engine actions below board up to depth that the referee does
+# not allow or applies to a different board, as (<board cells>, <action>)
+def cross_check(board, color, depth):
+    if not depth or game_over(board):
+        return []
+    errors = []
+    game = referee_game(board)
+    legal = set(game._available_actions(color.name))
+    for action in list(board.all_possible_actions(color)):
+        if action not in legal:
+            errors.append((tuple(board.cells), action))
+            continue
+        saved = game.board.copy(), game.hash, dict(game.score), game.nturns, game.history.copy()
+        game.update(color.name, action)
+        token = board.make(action)
+        if any(board.cells[i] != game.board[COORDS[i]] for i in range(BOARD_LEN ** 2)):
+            board.unmake(token)
+            errors.append((tuple(board.cells), action))
+        else:
+            errors += cross_check(board, opposite(color), depth - 1)
+            board.unmake(token)
+        game.board, game.hash, game.score, game.nturns, game.history = saved
+    return errors
+
+
+def positions(name):
+    if name == "opening":
+        return "opening position", Board(True), Color.white
+    board, color = list(midgame_positions())[int(name)]
+    return "midgame position {}".format(name), board, color
+
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    title, board, color = positions(sys.argv[2] if len(sys.argv) > 2 else "opening")
+    print("{}, depth {}, {} to move".format(title, depth, color.name))
+    print("{:<10}{:>12}{:>12}{:>10}{:>14}".format("", "leaves", "positions", "time", "positions/s"))
+    counts = {}
+    for name, start in (("Board", board.copy()), ("BitBoard", BitBoard.from_board(board)),
+                        ("referee", referee_game(board))):
+        nodes = [0]
+        begin = time.process_time()
+        if name == "referee":
+            counts[name] = referee_perft(start, color.name, depth, nodes)
+        else:
+            counts[name] = perft(start, color, depth, nodes)
+        elapsed = time.process_time() - begin
+        print("{:<10}{:>12}{:>12}{:>9.3f}s{:>14.0f}".format(
+            name, counts[name], nodes[0], elapsed, nodes[0] / elapsed if elapsed else 0))
+    if counts["Board"] != counts["BitBoard"]:
+        print("Board and BitBoard disagree")
+
+    engine, referee = divide(board.copy(), color, depth)
+    missing = Counter("BOOM" if action[0] == "BOOM" else "MOVE" for action in referee if action not in engine)
+    print("root actions: {} engine, {} referee; not generated by the engine: {} booms, {} moves".format(
+        len(engine), len(referee), missing["BOOM"], missing["MOVE"]))
+    errors = cross_check(board.copy(), color, depth)
+    print("engine actions the referee disallows or applies differently: {}".format(len(errors)))
+    for cells, action in errors[:10]:
+        print("  {} on {}".format(action, cells))
+    print("{:<36}{:>10}{:>10}".format("divide (differing root actions)", "engine", "referee"))
+    for action in sorted(set(engine) | set(referee)):
+        if engine.get(action) != referee.get(action):
+            print("{:<36}{:>10}{:>10}".format(str(action), engine.get(action, "-"), referee.get(action, "-")))
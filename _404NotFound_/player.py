@@ -1,10 +1,271 @@
+from _404NotFound_.algorithm.book import OpeningBook
+from _404NotFound_.algorithm.evalcache import EvaluationCache, BLACK_KEY
 from _404NotFound_.algorithm.minimax import *
+from _404NotFound_.algorithm.negamax import Negamax, NEG_INF, POS_INF
+from _404NotFound_.algorithm.parallel import ParallelRoot
+from _404NotFound_.algorithm.ponder import Ponderer
+from _404NotFound_.algorithm.smp import LazySMP
+from _404NotFound_.algorithm.tablebase import Tablebase
+from _404NotFound_.algorithm.telemetry import PhaseTimes, TimedNode, TimedValues, TelemetryLog
+from _404NotFound_.algorithm.timer import TimeManager
+from _404NotFound_.env.batch import np, batch_features
 from _404NotFound_.env.board import *
+from _404NotFound_.env.bitboard import BitBoard
 from _404NotFound_.env.pos import *
 
 from functools import reduce
+import os
+import time
+
+
+# scalar packing of the evaluation (ft, f0, f2, f3), keeping its order:
+# ft and f0 are ratios of token counts (a count / 0.01 when the divisor is
+# 0), exact integers once multiplied by lcm(1..12); f2 and f3 are integers
+RATIO_SCALE = 27720
+F3_BITS, F3_OFFSET = 13, 4096
+F2_BITS, F2_OFFSET = 8, 128
+F0_BITS = 26
+# bits below ft
+FT_SHIFT = F0_BITS + F2_BITS + F3_BITS
+# aspiration window half width, a 0.05 change of ft: narrower windows
+# fail between the odd and even iterations and cost more than they save
+ASPIRATION = round(0.05 * RATIO_SCALE) << FT_SHIFT
+
+# ft of an ending the tablebase has won, less its plies: above every
+# evaluation, the highest being 12 tokens / 0.01
+TABLEBASE_WIN = 10000
+
+# the opening book built by build_book
+BOOK_PATH = os.path.join(os.path.dirname(__file__), "opening.book")
+# the endgame tablebase built by build_tablebase
+TABLEBASE_PATH = os.path.join(os.path.dirname(__file__), "endgame.tb")
+
+
+# key of the position on board with color to move, in the book: the
+# canonical key, the book moves of a mirrored board are mirrored
+def book_key(board, color):
+    return board.canonical_key if color == Color.white else board.canonical_key ^ BLACK_KEY
+
+
+def pack_score(score):
+    ft, f0, f2, f3 = score
+    return (((round(ft * RATIO_SCALE) << F0_BITS | round(f0 * RATIO_SCALE))
+             << F2_BITS | f2 + F2_OFFSET) << F3_BITS) | f3 + F3_OFFSET
+
+
+def unpack_score(value):
+    return (value >> FT_SHIFT) / RATIO_SCALE, \
+        (value >> F2_BITS + F3_BITS & (1 << F0_BITS) - 1) / RATIO_SCALE, \
+        (value >> F3_BITS & (1 << F2_BITS) - 1) - F2_OFFSET, \
+        (value & (1 << F3_BITS) - 1) - F3_OFFSET
+
+
+class Minimax_Node(Node):
+
+    def __init__(self, board, color, action=None, cache=None, tablebase=None):
+        super().__init__(board, action)
+        self.color = color
+        # optional EvaluationCache shared by the nodes of a game
+        self.cache = cache
+        # optional endgame Tablebase
+        self.tablebase = tablebase
+        # (<state key>, <evaluation>) of the last position evaluated
+        self.memo = None
+
+    def successors(self, minimax_stage):
+        color = self.color
+        if minimax_stage == MMStage.max_stage:
+            for board, action in self.state.all_possible_states(color):
+                yield type(self)(board, color, action, self.cache, self.tablebase)
+        else:
+            for board, action in self.state.all_possible_states(opposite(color)):
+                yield type(self)(board, color, action, self.cache, self.tablebase)
+
+    def actions(self, minimax_stage):
+        if minimax_stage == MMStage.max_stage:
+            return self.state.all_possible_actions(self.color)
+        return self.state.all_possible_actions(opposite(self.color))
+
+    # tokens of the enemy less tokens of the player removed by a boom
+    def capture(self, action, minimax_stage):
+        if action[0] != "BOOM":
+            return None
+        white, black = self.state.component_totals(action[1][1] * BOARD_LEN + action[1][0])
+        swing = black - white
+        if (minimax_stage == MMStage.max_stage) != (self.color == Color.white):
+            swing = -swing
+        return swing
+
+    def captures(self, minimax_stage):
+        if minimax_stage == MMStage.max_stage:
+            return self.state.boom_actions(self.color)
+        return self.state.boom_actions(opposite(self.color))
+
+    # a boom settles the material term ft of the evaluation
+    def capture_bounds(self, action):
+        ft = self.capture_ratio(action)
+        return (ft,) + NEG_INF, (ft,) + POS_INF
+
+    def capture_ratio(self, action):
+        white, black = self.state.component_totals(action[1][1] * BOARD_LEN + action[1][0])
+        self_pieces_num = self.state.count_tokens(self.color)
+        other_pieces_num = self.state.count_tokens(opposite(self.color))
+        if self.color == Color.white:
+            self_pieces_num, other_pieces_num = self_pieces_num - white, other_pieces_num - black
+        else:
+            self_pieces_num, other_pieces_num = self_pieces_num - black, other_pieces_num - white
+        return self_pieces_num/0.01 if (other_pieces_num == 0) else self_pieces_num/other_pieces_num
+
+    # padded to the evaluation's length so scores negate consistently
+    def value_score(self, v):
+        return (13, v, 0, 0) if v > 0.8 else (-1, v, 0, 0)
+
+    # a won ending scores above every evaluation and a lost one below, the
+    # sooner won or the later lost the better; a drawn one as even material
+    def endgame_score(self, minimax_stage):
+        if self.tablebase is None:
+            return None
+        mover = self.color if minimax_stage == MMStage.max_stage else opposite(self.color)
+        plies = self.tablebase.probe(self.state, mover)
+        if plies is None:
+            return None
+        if mover != self.color:
+            plies = -plies
+        if plies > 0:
+            return self.score((TABLEBASE_WIN - plies, 0, 0, 0))
+        if plies < 0:
+            return self.score((-TABLEBASE_WIN - plies, 0, 0, 0))
+        return self.score((1, 1, 0, 0))
+
+    def cutoff(self):
+        return not self.state.count_stacks(Color.black) or not self.state.count_stacks(Color.white)
+
+    # evaluate once per position: the node keeps its last evaluation, the
+    # cache the evaluations of the game, by canonical key as the evaluation
+    # of a mirror image is the same
+    def evaluation(self):
+        key = self.state.key
+        if self.memo is not None and self.memo[0] == key:
+            return self.memo[1]
+        value = None
+        if self.cache is not None:
+            cache_key = self.state.canonical_key
+            cache_key = cache_key if self.color == Color.white else cache_key ^ BLACK_KEY
+            value = self.cache.get(cache_key)
+        if value is None:
+            value = self.evaluate()
+            if self.cache is not None:
+                self.cache.put(cache_key, value)
+        self.memo = (key, value)
+        return value
+
+    def evaluate(self):
+        color = self.color
+        self_squares, self_nums = self.state.get_stacks(color)
+
+        self_pieces_num = self.state.count_tokens(color)
+        other_pieces_num = self.state.count_tokens(opposite(color))
+
+        cells = self.state.cells
+        explore_area = set()
+        for i, num in zip(self_squares, self_nums):
+            for j in CARD_NEIGHBOURS[i][num]:
+                if cells[j] * color.value <= 0:
+                    explore_area.add(j)
+
+        boom_component = self.state.get_boom_component()
+        boom_reward = []
+        boom_penalty = []
+        for i in range(len(boom_component[Color.white])):
+            delta = boom_component[opposite(color)][i] - boom_component[color][i]
+            if delta > 0:
+                boom_reward.append(delta)
+            else:
+                boom_penalty.append(-delta)
+
+        ft = self_pieces_num/0.01 if (other_pieces_num == 0) else self_pieces_num/other_pieces_num
+        if other_pieces_num - sum(boom_reward) == 0:
+            f0 = (self_pieces_num - sum(boom_penalty)) / 0.01
+        else:
+            f0 = (self_pieces_num - sum(boom_penalty)) / (other_pieces_num - sum(boom_reward))
+        f2 = len(explore_area)-len(self_squares)
+        f3 = -self.state.token_distance()
+        
+        # self.state.print()
+        # print(self.action, (f0, f1, f2, f3, f4))
+        return self.score((ft,f0, f2, f3))
+
+    # the evaluation of the features (ft, f0, f2, f3)
+    def score(self, features):
+        return features
+
+    # the children are evaluated with NumPy in one batch
+    def child_evaluations(self, actions):
+        if np is None:
+            return None
+        cells = []
+        for action in actions:
+            token = self.make(action)
+            cells.append(list(self.state.cells))
+            self.unmake(token)
+        if not cells:
+            return []
+        return [self.score((ft, f0, int(f2), int(f3)))
+                for ft, f0, f2, f3 in batch_features(cells, self.color).tolist()]
+
+
+class Scalar_Node(Minimax_Node):
+    """ Minimax_Node with the evaluation packed into one integer """
+
+    def score(self, features):
+        return pack_score(features)
+
+    def capture_bounds(self, action):
+        ft = round(self.capture_ratio(action) * RATIO_SCALE) << FT_SHIFT
+        return ft, ft + (1 << FT_SHIFT) - 1
+
+    def value_score(self, v):
+        return pack_score(super().value_score(v))
+
 
 class Player:
+    # use the mask based BitBoard engine instead of the list based Board
+    bitboard = False
+    # deepest iteration of the search outside the explore stage
+    search_depth = 8
+    # plies of booms searched past the full width horizon, off: the player
+    # wins material with it but converts fewer won endings before the game
+    # repeats
+    quiescence_depth = 0
+    # CPU seconds for the whole game, the referee's -t default (the player
+    # is not told the limit)
+    time_budget = 60
+    # transposition table size, kept for the whole game
+    tt_size_mb = 16
+    # evaluation cache size, kept for the whole game
+    eval_cache_mb = 8
+    # opening book file, played without searching while the position is in
+    # it; None for none
+    book_path = BOOK_PATH
+    # endgame tablebase file, probed in the search and played from at the
+    # root once the position is in it; None for none
+    tablebase_path = TABLEBASE_PATH
+    # worker processes searching root actions in parallel, 0 for none; their
+    # CPU time is charged to time_budget though the referee does not see it
+    processes = 0
+    # lazy SMP helper processes searching beside the player on a shared
+    # transposition table, 0 for none; used instead of processes when set,
+    # their CPU time is charged the same way
+    smp_helpers = 0
+    # search the position after the opponent's predicted reply in a
+    # background process during its turn, on a shared transposition table;
+    # that CPU time is the opponent's and is not charged to time_budget
+    ponder = False
+    # keep the search statistics and phase times of every move in
+    # self.telemetry_log.records, appended as JSON lines to telemetry_path
+    # when set; timing slows the search
+    telemetry = False
+    telemetry_path = None
 
     def __init__(self, colour):
         """
@@ -17,9 +278,29 @@ class Player:
         program will play as (White or Black). The value will be one of the 
         strings "white" or "black" correspondingly.
         """
+        self.clock = TimeManager(self.time_budget)
+        self.clock.start()
         self.color = Color.white if colour == "white" else Color.black
-        self.board = Board(True)
+        self.board = BitBoard(True) if self.bitboard else Board(True)
         self.state_values = {}
+        self.tt = SharedTranspositionTable(self.tt_size_mb) if self.ponder else TranspositionTable(self.tt_size_mb)
+        self.eval_cache = EvaluationCache(self.eval_cache_mb)
+        self.book = None
+        if self.book_path is not None and os.path.exists(self.book_path):
+            self.book = OpeningBook(self.book_path)
+        # turns played from the book
+        self.book_moves = 0
+        self.tablebase = None
+        if self.tablebase_path is not None and os.path.exists(self.tablebase_path):
+            self.tablebase = Tablebase(self.tablebase_path)
+        # turns played from the tablebase
+        self.tablebase_moves = 0
+        # created on the first full width search
+        self.parallel = None
+        self.smp = None
+        self.ponderer = None
+        self.telemetry_log = TelemetryLog(self.telemetry_path) if self.telemetry else None
+        self.clock.stop()
 
     def action(self):
         """
@@ -30,63 +311,77 @@ class Player:
         return an allowed action to play on this turn. The action must be
         represented based on the spec's instructions for representing actions.
         """
-        color = self.color
-        class Minimax_Node(Node):
-
-            def __init__(self, board, action=None):
-                super().__init__(board, action)
-
-            def successors(self, minimax_stage):
-                if minimax_stage == MMStage.max_stage:
-                    for board, action in self.state.all_possible_states(color):
-                        yield Minimax_Node(board, action)
-                else:
-                    for board, action in self.state.all_possible_states(opposite(color)):
-                        yield Minimax_Node(board, action)
-
-            def cutoff(self):
-                return not self.state.get_black() or not self.state.get_white()
-
-            def evaluation(self):
-                self_pieces = self.state.get_pieces(color)
-                other_pieces = self.state.get_pieces(opposite(color))
-
-                self_pieces_num = sum(stack[1] for stack in self_pieces)
-                other_pieces_num = sum(stack[1] for stack in other_pieces)
-
-                explore_area = set()
-                for pos, num in self_pieces:
-                    for _p in pos.card_neighbour(num):
-                        if self.state.get_color(_p.x, _p.y) != color:
-                            explore_area.add(_p)
-
-                boom_component = self.state.get_boom_component()
-                boom_reward = []
-                boom_penalty = []
-                for i in range(len(boom_component[Color.white])):
-                    delta = boom_component[opposite(color)][i] - boom_component[color][i]
-                    if delta > 0:
-                        boom_reward.append(delta)
-                    else:
-                        boom_penalty.append(-delta)
-
-                ft = self_pieces_num/0.01 if (other_pieces_num == 0) else self_pieces_num/other_pieces_num
-                if other_pieces_num - sum(boom_reward) == 0:
-                    f0 = (self_pieces_num - sum(boom_penalty)) / 0.01
-                else:
-                    f0 = (self_pieces_num - sum(boom_penalty)) / (other_pieces_num - sum(boom_reward))
-                f2 = len(explore_area)-len(self_pieces)
-                f3 = -sum(num*sum(_n*_p.manh_dist(pos) for _p,_n in self_pieces) for pos,num in other_pieces)
-                
-                # self.state.print()
-                # print(self.action, (f0, f1, f2, f3, f4))
-                return (ft,f0, f2, f3)
-        
-        if self.explore_stage():
-            return minimax_decision(Minimax_Node(self.board), 1, self.state_values)
+        self.clock.start()
+        start = time.process_time()
+        # the pondering of a predicted reply the opponent played
+        pondered = self.ponderer.finish() if self.ponderer is not None else None
+        if self.book is not None:
+            moves = self.book.probe(book_key(self.board, self.color))
+            if moves:
+                self.book_moves += 1
+                action = mirror_action(moves[0][0]) if self.board.mirrored else moves[0][0]
+                self.log_move(start, action, "book")
+                self.clock.turns += 1
+                self.clock.stop()
+                return action
+        if self.tablebase is not None:
+            best = self.tablebase.best_action(self.board, self.color)
+            if best is not None:
+                self.tablebase_moves += 1
+                self.log_move(start, best[0], "tablebase")
+                self.clock.turns += 1
+                self.clock.stop()
+                return best[0]
+        # search on a copy so the game board is never left half updated
+        node = Scalar_Node(self.board.copy(), self.color, cache=self.eval_cache, tablebase=self.tablebase)
+        state_values, times = self.state_values, None
+        if self.telemetry_log is not None:
+            times = PhaseTimes()
+            self.tt.reset_stats()
+            node = TimedNode(node, times)
+            state_values = TimedValues(self.state_values, times)
+        # kept after the search so its counters can be read
+        explore = self.explore_stage()
+        if self.smp_helpers and not explore and self.smp is None:
+            self.smp = LazySMP(self.smp_helpers, self.tt_size_mb, self.state_values, inplace=True,
+                               quiescence=self.quiescence_depth, pvs=True, aspiration=ASPIRATION)
+            self.tt = self.smp.tt
+        elif self.processes and not self.smp_helpers and not explore and self.parallel is None:
+            self.parallel = ParallelRoot(self.processes, self.tt_size_mb, self.state_values, inplace=True,
+                                         quiescence=self.quiescence_depth, pvs=True)
+        self.engine = Negamax(state_values, self.tt, inplace=True,
+                              quiescence=0 if explore else self.quiescence_depth,
+                              pvs=True, aspiration=ASPIRATION, parallel=None if explore else self.parallel)
+        workers = self.smp or self.parallel
+        source = "search"
+        if explore:
+            action = self.engine.search(node, 1)
+            self.engine.completed = 1
         else:
-            return minimax_decision(Minimax_Node(self.board), 3, self.state_values)
+            worker_time = workers.worker_time if workers else 0
+            if pondered is not None and pondered[0] >= self.search_depth:
+                # pondered to full depth: the search is done
+                action, source = pondered[1], "ponder"
+                self.engine.completed, self.engine.score = pondered[0], pondered[2]
+            elif self.smp:
+                action = self.smp.search(self.engine, node, self.search_depth, *self.clock.allocate())
+            else:
+                action = self.engine.iterative_deepening(node, self.search_depth, *self.clock.allocate())
+            if workers:
+                self.clock.used += workers.worker_time - worker_time
+            if self.ponder:
+                self.start_pondering(action)
+        self.log_move(start, action, source, self.engine, times)
+        self.clock.turns += 1
+        self.clock.stop()
+        return action
 
+    # add the move to the telemetry log, with engine and the phase times
+    # for a search; start is the CPU time the turn started at
+    def log_move(self, start, action, source, engine=None, times=None):
+        if self.telemetry_log is not None:
+            self.telemetry_log.record(time.process_time() - start, engine, times, turn=self.clock.turns,
+                                      color=self.color.name, action=action, source=source)
 
     def update(self, colour, action):
         """
@@ -106,20 +401,39 @@ class Player:
         for the player colour (your method does not need to validate the action
         against the game rules).
         """
+        self.clock.start()
         self.board = self.board.apply_action(action)
+        if self.ponderer is not None and colour != self.color.name:
+            self.ponderer.check(self.board)
+        self.clock.stop()
+
+    # ponder the position after action and the opponent's predicted reply
+    def start_pondering(self, action):
+        if self.ponderer is None:
+            # self.tt is shared, the player's own or the lazy SMP one
+            self.ponderer = Ponderer(self.tt, self.state_values, inplace=True,
+                                     quiescence=self.quiescence_depth, pvs=True, aspiration=ASPIRATION)
+        board = self.board.apply_action(action)
+        reply = self.ponderer.predict(board)
+        if reply is None:
+            return
+        board = board.apply_action(reply)
+        if board.count_tokens(Color.white) and board.count_tokens(Color.black):
+            self.ponderer.start(Scalar_Node(board, self.color, cache=self.eval_cache, tablebase=self.tablebase),
+                                self.search_depth)
 
+    # stop pondering for good, the background process exits
+    def stop_pondering(self):
+        if self.ponderer is not None:
+            self.ponderer.close()
+            self.ponderer = None
+
+    # no stack of either color is next to an enemy stack yet
     def explore_stage(self):
-        color = self.color
-        self_pieces = self.board.get_pieces(color)
-        other_pieces = self.board.get_pieces(opposite(color))
-        for pos, num in self_pieces:
-            for _p in pos.card_neighbour(num):
-                for _op in pos.neighbour():
-                    if self.board.get_color(_op.x, _op.y) == opposite(color):
-                        return False
-        for pos, num in other_pieces:
-            for _p in pos.card_neighbour(num):
-                for _op in pos.neighbour():
-                    if self.board.get_color(_op.x, _op.y) == color:
-                        return False
+        cells = self.board.cells
+        sign = self.color.value
+        for i in self.board.get_stacks(self.color)[0]:
+            for j in NEIGHBOURS[i]:
+                if cells[j] * sign < 0:
+                    return False
         return True
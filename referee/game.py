@@ -15,6 +15,7 @@ structures for representing the state of a game.
 
 import sys
 import time
+import random
 from collections import Counter
 
 
@@ -131,6 +132,12 @@ def _NEAR_SQUARES(square):
             (x-1,y-1),(x,y-1),(x+1,y-1)} & _ALL_SQUARES
 
 _MAX_TURNS = 250 # per player
+
+# Zobrist keys for repeated-state checking: one random 64-bit int per
+# (square, signed stack size); the state hash is the xor over all stacks
+_ZOBRIST_RANDOM = random.Random(0)
+_ZOBRIST = {(xy, n): _ZOBRIST_RANDOM.getrandbits(64)
+            for xy in sorted(_ALL_SQUARES) for n in range(-12, 13) if n}
  
 
 
@@ -147,6 +154,11 @@ class Game:
             self.board[xy] = +1
         for xy in _BLACK_START_SQUARES:
             self.board[xy] = -1
+        # Zobrist hash of the board, updated with every change to a square
+        self.hash = 0
+        for xy, n in self.board.items():
+            if n:
+                self.hash ^= _ZOBRIST[xy, n]
         # also keep track of some other state variables for win/draw
         # detection (score, number of turns, state history)
         self.score = {'white': 12, 'black': 12}
@@ -205,15 +217,15 @@ class Game:
         if atype == "MOVE":
             n, a, b = aargs
             n = -n if self.board[a] < 0 else n
-            self.board[a] -= n
-            self.board[b] += n
+            self._set(a, self.board[a] - n)
+            self._set(b, self.board[b] + n)
         else: # atype == "BOOM":
             start_square, = aargs
             to_boom = [start_square]
             for boom_square in to_boom:
                 n = self.board[boom_square]
                 self.score["white" if n > 0 else "black"] -= abs(n)
-                self.board[boom_square] = 0
+                self._set(boom_square, 0)
                 for near_square in _NEAR_SQUARES(boom_square):
                     if self.board[near_square] != 0:
                         to_boom.append(near_square)
@@ -221,6 +233,15 @@ class Game:
         self._turn_detect_draw()
         # TODO: return a sanitised version of the action?
 
+    def _set(self, square, n):
+        """Set the stack at a square, keeping the Zobrist hash in sync"""
+        old = self.board[square]
+        if old:
+            self.hash ^= _ZOBRIST[square, old]
+        if n:
+            self.hash ^= _ZOBRIST[square, n]
+        self.board[square] = n
+
     def _available_actions(self, colour):
         """
         A list of currently-available actions for a particular player
@@ -263,7 +284,7 @@ class Game:
         """
         return (
             # same colour tokens in the same positions
-            tuple((sq,n) for sq,n in self.board.items() if n),
+            self.hash,
             # on the same player's turn
             self.nturns % 2,
         )
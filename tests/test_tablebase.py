@@ -0,0 +1,59 @@
+"""
+One-ply consistency of the endgame tablebase: the value of a position is
+the best value its actions lead to, as best_action computes it from the
+table. Run with: python -m unittest tests.test_tablebase
+The 4 token build takes several minutes; set SLOW_TESTS=1 to run it.
+"""
+import os
+import random
+import tempfile
+import unittest
+
+from _404NotFound_.algorithm.tablebase import *
+
+
+# the board of the placements white / black
+def make_board(white, black):
+    cells = [0] * BOARD_LEN ** 2
+    for square, num in white:
+        cells[square] = num
+    for square, num in black:
+        cells[square] = -num
+    board = Board()
+    board.__setstate__(bytes(cell & 0xff for cell in cells))
+    return board
+
+
+class TablebaseTest(unittest.TestCase):
+    # check samples random positions of every class of the table built
+    # with max_total_tokens
+    def check_consistency(self, max_total_tokens, samples):
+        rng = random.Random(404)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "endgame.tb")
+            build_tablebase(path, max_total_tokens)
+            table = Tablebase(path)
+            for w, b in table.classes:
+                whites, blacks = placements(w), placements(b)
+                checked = 0
+                while checked < samples:
+                    white, black = rng.choice(whites), rng.choice(blacks)
+                    if {square for square, num in white} & {square for square, num in black}:
+                        continue
+                    board = make_board(white, black)
+                    for color in (Color.white, Color.black):
+                        action, value = table.best_action(board, color)
+                        self.assertEqual(table.probe(board, color), value, (w, b, white, black, color, action))
+                    checked += 1
+            table.data.close()
+
+    def test_three_tokens(self):
+        self.check_consistency(3, 2000)
+
+    @unittest.skipUnless(os.environ.get("SLOW_TESTS"), "builds about 15 million positions")
+    def test_four_tokens(self):
+        self.check_consistency(4, 5000)
+
+
+if __name__ == "__main__":
+    unittest.main()